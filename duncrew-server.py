@@ -31,16 +31,21 @@ import re
 import json
 import argparse
 import threading
+import queue
 import time
 import uuid
 import subprocess
 import shlex
+import socket
 import shutil
+import signal
+import stat
 from pathlib import Path
 from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import unquote, urlparse, parse_qs
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass, field, replace
 
 # 🌐 智能代理策略: 优先使用系统/环境变量代理，探测失败时才回退直连
 # OpenClaw 做法: 读取 HTTP_PROXY/HTTPS_PROXY 环境变量，按需走代理
@@ -98,6 +103,14 @@ try:
 except ImportError:
     HAS_YAML = False
 
+# orjson (可选，响应序列化加速；缺失时回退标准库 json)
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
+
 # MCP 客户端支持
 try:
     from skills.mcp_manager import MCPClientManager
@@ -133,6 +146,8 @@ except ImportError:
     HAS_OCR = False
 
 import base64
+import codecs
+import gzip
 import io
 import sqlite3
 
@@ -254,8 +269,13 @@ _db_lock = threading.Lock()
 DANGEROUS_COMMANDS = {'rm -rf /', 'format', 'mkfs', 'dd if=/dev/zero'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB 最大文件大小
 MAX_OUTPUT_SIZE = 512 * 1024      # 512KB 最大输出
+GZIP_MIN_SIZE = 1024              # JSON 响应超过 1KB 且客户端支持时 gzip
 PLUGIN_TIMEOUT = 60               # 插件执行超时(秒)
 
+# 错误响应的固定 JSON 片段 (预编码)
+ERROR_JSON_PREFIX = b'{"error":'
+ERROR_JSON_SUFFIX = b',"status":"error"}'
+
 
 def safe_utf8_truncate(text: str, max_bytes: int) -> str:
     """UTF-8 安全截断，不破坏多字节字符"""
@@ -528,6 +548,7 @@ class ToolRegistry:
 
     def scan_plugins(self):
         """递归扫描 skills/ 目录，统一从 SKILL.md frontmatter 注册可执行插件 + 指令型技能"""
+        invalidate_cache('skills')
         skills_dirs = self._get_skills_dirs()
         if not skills_dirs:
             return
@@ -539,8 +560,10 @@ class ToolRegistry:
         seen_tools: set = set()  # 防止重复注册同名工具
 
         for skills_dir in skills_dirs:
+            skill_mds, manifest_paths = scan_skill_files(skills_dir)
+
             # ── 统一扫描 SKILL.md ──
-            for skill_md in skills_dir.rglob('SKILL.md'):
+            for skill_md in skill_mds:
                 skill_dir = skill_md.parent
                 dir_key = str(skill_dir.resolve())
 
@@ -640,7 +663,7 @@ class ToolRegistry:
                     print(f"[ToolRegistry] Error loading {skill_md}: {e}")
 
             # ── Deprecated fallback: manifest.json (兼容无 SKILL.md 的第三方技能) ──
-            for manifest_path in skills_dir.rglob('manifest.json'):
+            for manifest_path in manifest_paths:
                 skill_dir = manifest_path.parent
                 dir_key = str(skill_dir.resolve())
                 if dir_key in seen_dirs:
@@ -1392,19 +1415,138 @@ class BrowserManager:
             return json.dumps({'status': 'error', 'error': str(e)}, ensure_ascii=False)
 
 
+# API 文档页模板 (dist/ 不存在时由 handle_index 返回)
+INDEX_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><title>DunCrew Native Server</title></head>
+<body style="font-family: monospace; background: #0f172a; color: #e2e8f0; padding: 30px;">
+<h1>DunCrew Native Server v{version}</h1>
+<p style="color: #94a3b8;">独立运行的本地 AI 操作系统后端</p>
+<p>Clawd Path: <code style="color: #22d3ee;">{path}</code></p>
+
+<h2>📡 API Endpoints</h2>
+<div style="background: #1e293b; padding: 15px; border-radius: 8px;">
+<h3 style="color: #f59e0b;">数据读取</h3>
+<ul>
+<li><a href="/status" style="color: #60a5fa;">/status</a> - 服务状态</li>
+<li><a href="/files" style="color: #60a5fa;">/files</a> - 文件列表</li>
+<li><a href="/file/SOUL.md" style="color: #60a5fa;">/file/SOUL.md</a> - 读取 SOUL</li>
+<li><a href="/skills" style="color: #60a5fa;">/skills</a> - 技能列表</li>
+<li><a href="/all" style="color: #60a5fa;">/all</a> - 所有数据</li>
+</ul>
+
+<h3 style="color: #10b981;">🛠️ 工具执行 (POST)</h3>
+<ul>
+<li><code>/api/tools/execute</code> - 执行工具</li>
+<li>支持: readFile, writeFile, listDir, runCmd, appendFile</li>
+</ul>
+</div>
+
+<h2>🧪 测试</h2>
+<pre style="background: #1e293b; padding: 15px; border-radius: 8px; overflow-x: auto;">
+curl -X POST http://localhost:3001/api/tools/execute \\
+  -H "Content-Type: application/json" \\
+  -d '{{"name": "listDir", "args": {{"path": "."}}}}'
+</pre>
+</body>
+</html>"""
+
+
+# dist/ 未构建时 serve_static_file 返回的提示页
+STATIC_NOT_BUILT_HTML = b'''<!DOCTYPE html>
+<html>
+<head><title>DunCrew Server</title></head>
+<body style="font-family: system-ui; padding: 40px; background: #1a1a2e; color: #eee;">
+<h1>DunCrew Native Server</h1>
+<p>Frontend not built. Run <code>npm run build</code> to generate dist/</p>
+<p>Or access dev server at <a href="http://localhost:5173">http://localhost:5173</a></p>
+<hr>
+<p>API Endpoints:</p>
+<ul>
+<li>GET /status - Server status</li>
+<li>GET /skills - List skills</li>
+<li>POST /api/tools/execute - Execute tool</li>
+</ul>
+</body>
+</html>'''
+
+
 # 全局浏览器管理器单例
 _browser_manager = BrowserManager()
 
 
+@dataclass(frozen=True)
+class TaskState:
+    """后台任务状态快照 (不可变，更新时整体替换 ClawdDataHandler.tasks[task_id])"""
+    task_id: str
+    status: str
+    log_path: str | None  # 排队中尚未创建日志时为 None
+    file_size: int = 0
+    created: float = field(default_factory=time.monotonic)
+
+
 class ClawdDataHandler(BaseHTTPRequestHandler):
     clawd_path = None
+    clawd_path_resolved = None  # main() 中 resolve 一次，供路径穿越检查复用
+    clawd_prefix = ''  # str(clawd_path_resolved) + os.sep
+    # 热路径上用到的固定子路径，main() 中计算一次，避免每个请求重复 Path 拼接
+    soul_path = None
+    identity_path = None
+    memory_md_path = None
+    memory_dir = None
+    skills_dir = None
     project_path = None  # 项目目录，用于加载内置技能
     registry = None  # type: ToolRegistry
     subagent_manager = None  # type: SubagentManager
-    tasks = {}
-    tasks_lock = threading.Lock()
+    index_html = b''  # API 文档页，main() 中按 INDEX_TEMPLATE 渲染一次
+    tasks = {}  # task_id -> TaskState；单个 key 赋值在 GIL 下是原子的，读写无需加锁
+    skill_installs = {}  # installId -> 安装进度 (cloning|validating|scanning|done|error)
+    skill_installs_lock = threading.Lock()
     _gene_file_lock = threading.Lock()  # 基因文件读写锁，防止并发写入损坏
     
+    # 精确匹配的 GET 路由: path -> 处理器方法名 (无参数)
+    GET_ROUTES = {
+        '/status': 'handle_status',
+        '/files': 'handle_files',
+        '/skills': 'handle_skills',
+        '/nexuses': 'handle_nexuses',
+        '/memories': 'handle_memories',
+        '/tools': 'handle_tools_list',
+        '/all': 'handle_all',
+        '/': 'handle_index',
+        '': 'handle_index',
+        '/api/genes/load': 'handle_gene_load',
+        '/api/capsules/load': 'handle_capsule_load',
+        '/api/amendments/load': 'handle_amendment_load',
+        '/mcp/servers': 'handle_mcp_servers_list',
+        '/api/memory/stats': 'handle_memory_stats',
+        '/data': 'handle_data_list',  # 列出所有数据键
+    }
+    # 精确匹配的 GET 路由: path -> 处理器方法名 (接收 query 参数)
+    GET_QUERY_ROUTES = {
+        '/api/traces/search': 'handle_trace_search',
+        '/api/traces/recent': 'handle_trace_recent',
+        '/api/registry/skills': 'handle_registry_skills_search',
+        '/api/registry/mcp': 'handle_registry_mcp_search',
+        '/api/sessions': 'handle_sessions_list',
+        '/api/memory/search': 'handle_memory_search',
+    }
+    
+    # HTTP/1.1 keep-alive: 前端高频轮询复用同一 TCP 连接；所有响应都必须带 Content-Length (或 chunked)
+    protocol_version = 'HTTP/1.1'
+    timeout = 120  # 空闲 keep-alive 连接的超时 (秒)
+    
+    def handle_one_request(self):
+        self._response_sent = False
+        super().handle_one_request()
+        if not self._response_sent:
+            # 处理器没有发送响应时关闭连接，避免 keep-alive 客户端一直等待
+            self.close_connection = True
+    
+    def send_response(self, code, message=None):
+        self._response_sent = True
+        super().send_response(code, message)
+    
     def log_message(self, format, *args):
         timestamp = datetime.now().strftime('%H:%M:%S')
         print(f"[{timestamp}] {format % args}")
@@ -1414,126 +1556,111 @@ class ClawdDataHandler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
     
-    def send_json(self, data, status=200):
+    def send_json(self, data, status=200, pretty=False):
+        """数据接口一律紧凑输出；pretty=True 仅用于给人看的调试类接口 (如 /status)"""
+        self.send_json_body(encode_json(data, pretty), status)
+    
+    def send_json_body(self, body, status=200):
+        """发送已序列化的 JSON bytes (用于缓存的响应)，客户端支持时 gzip 压缩"""
+        gzipped = len(body) >= GZIP_MIN_SIZE and 'gzip' in self.headers.get('Accept-Encoding', '')
+        if gzipped:
+            body = gzip.compress(body, compresslevel=1)
         self.send_response(status)
         self.send_header('Content-Type', 'application/json')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Content-Length', str(len(body)))
         self.send_cors_headers()
         self.end_headers()
         try:
-            self.wfile.write(json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8'))
+            self.wfile.write(body)
         except (ConnectionAbortedError, ConnectionResetError, BrokenPipeError):
             pass  # 客户端已断开，静默忽略
     
     def send_text(self, text, status=200):
+        body = text.encode('utf-8')
         self.send_response(status)
         self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
         self.send_cors_headers()
         self.end_headers()
-        self.wfile.write(text.encode('utf-8'))
+        self.wfile.write(body)
+    
+    def send_file_body(self, f, size):
+        """响应头之后直接把文件写入 socket: 支持时走 os.sendfile 零拷贝，否则 socket 自动回退为分块 send"""
+        try:
+            self.connection.sendfile(f, 0, size)
+        except (ConnectionAbortedError, ConnectionResetError, BrokenPipeError):
+            self.close_connection = True  # 客户端已断开，静默忽略
     
     def send_error_json(self, message, status=404):
-        self.send_json({'error': message, 'status': 'error'}, status)
+        if self._response_sent:
+            # 响应头已发出 (如流式转发中途出错)，再写一个响应会破坏 keep-alive 连接上的数据流
+            self.close_connection = True
+            return
+        # 只序列化 message 本身，前后固定片段为预编码 bytes
+        self.send_json_body(ERROR_JSON_PREFIX + encode_json(str(message)) + ERROR_JSON_SUFFIX, status)
     
     def do_OPTIONS(self):
         self.send_response(200)
+        self.send_header('Content-Length', '0')
         self.send_cors_headers()
         self.end_headers()
     
     def do_GET(self):
-        parsed = urlparse(self.path)
-        path = unquote(parsed.path)
-        query = parse_qs(parsed.query)
-        
-        routes = {
-            '/status': self.handle_status,
-            '/files': self.handle_files,
-            '/skills': self.handle_skills,
-            '/nexuses': self.handle_nexuses,
-            '/memories': self.handle_memories,
-            '/tools': self.handle_tools_list,
-            '/all': self.handle_all,
-            '/': self.handle_index,
-            '': self.handle_index,
-        }
-        
-        if path in routes:
-            routes[path]()
-        elif path.startswith('/file/'):
-            self.handle_file(path[6:])
-        elif path.startswith('/nexuses/') and '/experience' not in path:
-            nexus_name = path[9:]  # strip '/nexuses/'
+        raw_path, _, raw_query = self.path.partition('?')
+        path = unquote(raw_path)
+        query = parse_qs(raw_query) if raw_query else {}  # 大多数请求不带查询串
+        
+        if path in self.GET_ROUTES:
+            getattr(self, self.GET_ROUTES[path])()
+        elif path in self.GET_QUERY_ROUTES:
+            getattr(self, self.GET_QUERY_ROUTES[path])(query)
+        elif (rest := path.removeprefix('/file/')) != path:
+            self.handle_file(rest)
+        elif (nexus_name := path.removeprefix('/nexuses/')) != path and '/experience' not in path:
             if nexus_name == 'health':
                 self.handle_nexuses_health()
-            elif nexus_name.endswith('/fitness'):
-                self.handle_nexus_fitness_get(nexus_name[:-8])  # strip '/fitness'
-            elif nexus_name.endswith('/sop-content'):
-                self.handle_nexus_sop_content_get(nexus_name[:-12])  # strip '/sop-content'
-            elif nexus_name.endswith('/sop-history'):
-                self.handle_nexus_sop_history_get(nexus_name[:-12])  # strip '/sop-history'
+            elif (rest := nexus_name.removesuffix('/fitness')) != nexus_name:
+                self.handle_nexus_fitness_get(rest)
+            elif (rest := nexus_name.removesuffix('/sop-content')) != nexus_name:
+                self.handle_nexus_sop_content_get(rest)
+            elif (rest := nexus_name.removesuffix('/sop-history')) != nexus_name:
+                self.handle_nexus_sop_history_get(rest)
             else:
                 self.handle_nexus_detail(nexus_name)
-        elif path.startswith('/task/status/'):
-            task_id = path[13:]
+        elif (task_id := path.removeprefix('/task/status/')) != path:
             offset = int(query.get('offset', ['0'])[0])
             self.handle_task_status(task_id, offset)
-        elif path == '/api/traces/search':
-            self.handle_trace_search(query)
-        elif path == '/api/traces/recent':
-            self.handle_trace_recent(query)
-        elif path == '/api/genes/load':
-            self.handle_gene_load()
-        elif path == '/api/capsules/load':
-            self.handle_capsule_load()
-        elif path == '/api/amendments/load':
-            self.handle_amendment_load()
-        elif path == '/api/registry/skills':
-            self.handle_registry_skills_search(query)
-        elif path == '/api/registry/mcp':
-            self.handle_registry_mcp_search(query)
+        elif (install_id := path.removeprefix('/skills/install/')) != path:
+            self.handle_skill_install_status(install_id)
         elif path.startswith('/skills/') and path.endswith('/raw'):
-            skill_name = path[8:-4]  # strip '/skills/' and '/raw'
-            self.handle_skill_raw(skill_name)
-        elif path == '/mcp/servers':
-            self.handle_mcp_servers_list()
+            self.handle_skill_raw(path.removeprefix('/skills/').removesuffix('/raw'))
         # V2: Session API
-        elif path == '/api/sessions':
-            self.handle_sessions_list(query)
-        elif path.startswith('/api/sessions/') and path.endswith('/messages'):
-            session_id = path[14:-9]  # strip '/api/sessions/' and '/messages'
-            self.handle_session_messages_get(session_id, query)
-        elif path.startswith('/api/sessions/') and path.endswith('/checkpoint'):
-            session_id = path[14:-11]  # strip '/api/sessions/' and '/checkpoint'
-            self.handle_session_checkpoint_get(session_id)
-        elif path.startswith('/api/sessions/') and not path.endswith('/messages') and not path.endswith('/checkpoint'):
-            session_id = path[14:]
-            self.handle_session_get(session_id)
+        elif (rest := path.removeprefix('/api/sessions/')) != path:
+            if (session_id := rest.removesuffix('/messages')) != rest:
+                self.handle_session_messages_get(session_id, query)
+            elif (session_id := rest.removesuffix('/checkpoint')) != rest:
+                self.handle_session_checkpoint_get(session_id)
+            else:
+                self.handle_session_get(rest)
         # V2: Memory API
-        elif path == '/api/memory/search':
-            self.handle_memory_search(query)
-        elif path == '/api/memory/stats':
-            self.handle_memory_stats()
-        elif path.startswith('/api/memory/nexus/'):
-            nexus_id = path[18:]
+        elif (nexus_id := path.removeprefix('/api/memory/nexus/')) != path:
             limit = int(query.get('limit', ['20'])[0])
             self.handle_memory_by_nexus(nexus_id, limit)
         # V2: Scoring API
         elif path.startswith('/api/nexus/') and path.endswith('/scoring'):
-            nexus_id = path[11:-8]  # strip '/api/nexus/' and '/scoring'
-            self.handle_scoring_get(nexus_id)
-        elif path.startswith('/data/'):
+            self.handle_scoring_get(path.removeprefix('/api/nexus/').removesuffix('/scoring'))
+        elif (key := path.removeprefix('/data/')) != path:
             # 前端数据读取 API
-            key = path[6:]  # strip '/data/'
             self.handle_data_get(key)
-        elif path == '/data':
-            # 列出所有数据键
-            self.handle_data_list()
         else:
             # 静态文件服务 (托管 dist/ 目录)
             self.serve_static_file(path)
     
     def do_POST(self):
-        parsed = urlparse(self.path)
-        path = unquote(parsed.path)
+        path = unquote(self.path.partition('?')[0])
         content_type = self.headers.get('Content-Type', '')
         
         # 文件上传：multipart/form-data 单独处理（避免大文件 JSON 编码 OOM）
@@ -1542,11 +1669,11 @@ class ClawdDataHandler(BaseHTTPRequestHandler):
             return
         
         content_length = int(self.headers.get('Content-Length', 0))
-        body = self.rfile.read(content_length).decode('utf-8') if content_length > 0 else '{}'
+        body = self.rfile.read(content_length) if content_length > 0 else b''
         
         try:
-            data = json.loads(body) if body else {}
-        except json.JSONDecodeError:
+            data = decode_json(body) if body else {}
+        except ValueError:
             self.send_error_json('Invalid JSON', 400)
             return
         
@@ -1640,13 +1767,12 @@ class ClawdDataHandler(BaseHTTPRequestHandler):
             self.send_error_json(f'Unknown endpoint: {path}', 404)
     
     def do_PUT(self):
-        parsed = urlparse(self.path)
-        path = unquote(parsed.path)
+        path = unquote(self.path.partition('?')[0])
         content_length = int(self.headers.get('Content-Length', 0))
-        body = self.rfile.read(content_length).decode('utf-8') if content_length > 0 else '{}'
+        body = self.rfile.read(content_length) if content_length > 0 else b''
         try:
-            data = json.loads(body) if body else {}
-        except json.JSONDecodeError:
+            data = decode_json(body) if body else {}
+        except ValueError:
             self.send_error_json('Invalid JSON', 400)
             return
         
@@ -1657,8 +1783,7 @@ class ClawdDataHandler(BaseHTTPRequestHandler):
             self.send_error_json(f'Unknown PUT endpoint: {path}', 404)
     
     def do_DELETE(self):
-        parsed = urlparse(self.path)
-        path = unquote(parsed.path)
+        path = unquote(self.path.partition('?')[0])
         
         if path.startswith('/api/sessions/') and path.endswith('/checkpoint'):
             session_id = path[14:-11]
@@ -2038,23 +2163,9 @@ class ClawdDataHandler(BaseHTTPRequestHandler):
             # dist/ 不存在时返回提示
             self.send_response(200)
             self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(STATIC_NOT_BUILT_HTML)))
             self.end_headers()
-            self.wfile.write(b'''<!DOCTYPE html>
-<html>
-<head><title>DunCrew Server</title></head>
-<body style="font-family: system-ui; padding: 40px; background: #1a1a2e; color: #eee;">
-<h1>DunCrew Native Server</h1>
-<p>Frontend not built. Run <code>npm run build</code> to generate dist/</p>
-<p>Or access dev server at <a href="http://localhost:5173">http://localhost:5173</a></p>
-<hr>
-<p>API Endpoints:</p>
-<ul>
-<li>GET /status - Server status</li>
-<li>GET /skills - List skills</li>
-<li>POST /api/tools/execute - Execute tool</li>
-</ul>
-</body>
-</html>''')
+            self.wfile.write(STATIC_NOT_BUILT_HTML)
             return
         
         # 确定文件路径
@@ -2086,19 +2197,21 @@ class ClawdDataHandler(BaseHTTPRequestHandler):
         content_type = MIME_TYPES.get(suffix, 'application/octet-stream')
         
         try:
-            with open(file_path, 'rb') as f:
-                content = f.read()
-            
+            f = open(file_path, 'rb')
+        except Exception as e:
+            self.send_error_json(f'Failed to read file: {str(e)}', 500)
+            return
+        
+        with f:
+            size = os.fstat(f.fileno()).st_size
             self.send_response(200)
             self.send_header('Content-Type', content_type)
-            self.send_header('Content-Length', str(len(content)))
+            self.send_header('Content-Length', str(size))
             # 缓存控制：静态资源长期缓存
             if '/assets/' in str(file_path):
                 self.send_header('Cache-Control', 'public, max-age=31536000')
             self.end_headers()
-            self.wfile.write(content)
-        except Exception as e:
-            self.send_error_json(f'Failed to read file: {str(e)}', 500)
+            self.send_file_body(f, size)
     
     # ============================================
     # 📦 前端数据持久化 API (/data)
@@ -2495,6 +2608,7 @@ class ClawdDataHandler(BaseHTTPRequestHandler):
             if part.startswith('boundary='):
                 boundary = part[len('boundary='):].strip('"')
         if not boundary:
+            self.close_connection = True  # 请求体未读取，不能复用连接
             self.send_error_json('无效的 multipart 请求：缺少 boundary', 400)
             return
 
@@ -2764,7 +2878,7 @@ class ClawdDataHandler(BaseHTTPRequestHandler):
         try:
             resolved = file_path.resolve()
             if not allow_outside:
-                resolved.relative_to(self.clawd_path.resolve())
+                resolved.relative_to(self.clawd_path_resolved)
         except ValueError:
             raise PermissionError(f"Access denied: path outside allowed directory")
         
@@ -2798,7 +2912,7 @@ class ClawdDataHandler(BaseHTTPRequestHandler):
         if os.path.isabs(file_path_str):
             file_path = Path(file_path_str).resolve()
             # 安全检查：只允许访问 clawd 工作目录下的文件
-            allowed_root = self.clawd_path.resolve()
+            allowed_root = self.clawd_path_resolved
             try:
                 file_path.relative_to(allowed_root)
             except ValueError:
@@ -3051,8 +3165,12 @@ class ClawdDataHandler(BaseHTTPRequestHandler):
         if not dir_path.is_dir():
             raise ValueError(f"Not a directory: {path}")
         
+        # scandir 的 DirEntry 自带 d_type，且 stat() 结果会缓存，每项最多一次 stat
+        with os.scandir(dir_path) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        
         items = []
-        for item in sorted(dir_path.iterdir()):
+        for item in entries:
             item_type = 'dir' if item.is_dir() else 'file'
             size = item.stat().st_size if item.is_file() else 0
             items.append({
@@ -3341,6 +3459,7 @@ class ClawdDataHandler(BaseHTTPRequestHandler):
         
         with open(memory_file, 'a', encoding='utf-8') as f:
             f.write(entry)
+        invalidate_cache('memories')
         
         # ---- 路径 2: SQLite memory 表 (支持 FTS5 搜索) ----
         try:
@@ -3415,6 +3534,7 @@ class ClawdDataHandler(BaseHTTPRequestHandler):
             memory_dir = self.clawd_path / 'memory'
             if memory_dir.exists():
                 query_lower = query.lower()
+                seen = set(results)  # 去重用集合，避免每条都线性扫描 results
                 for memory_file in sorted(memory_dir.glob('*.md'), reverse=True)[:7]:
                     try:
                         content = memory_file.read_text(encoding='utf-8')
@@ -3423,7 +3543,8 @@ class ClawdDataHandler(BaseHTTPRequestHandler):
                             if query_lower in entry.lower():
                                 date = memory_file.stem
                                 item = f"[{date}] {entry.strip()[:200]}"
-                                if item not in results:  # 去重
+                                if item not in seen:  # 去重
+                                    seen.add(item)
                                     results.append(item)
                                     remaining -= 1
                                     if remaining <= 0:
@@ -3652,58 +3773,27 @@ python {safe_name}.py
     # ============================================
     
     def handle_index(self):
-        # 优先托管前端 dist/index.html (便携式分发模式)
-        index_file = APP_DIR / 'dist' / 'index.html'
-        if index_file.exists():
-            self.serve_static_file('/')
-            return
-
-        # dist 不存在时显示 API 文档页
-        html = f"""<!DOCTYPE html>
-<html>
-<head><title>DunCrew Native Server</title></head>
-<body style="font-family: monospace; background: #0f172a; color: #e2e8f0; padding: 30px;">
-<h1>DunCrew Native Server v{VERSION}</h1>
-<p style="color: #94a3b8;">独立运行的本地 AI 操作系统后端</p>
-<p>Clawd Path: <code style="color: #22d3ee;">{self.clawd_path}</code></p>
-
-<h2>📡 API Endpoints</h2>
-<div style="background: #1e293b; padding: 15px; border-radius: 8px;">
-<h3 style="color: #f59e0b;">数据读取</h3>
-<ul>
-<li><a href="/status" style="color: #60a5fa;">/status</a> - 服务状态</li>
-<li><a href="/files" style="color: #60a5fa;">/files</a> - 文件列表</li>
-<li><a href="/file/SOUL.md" style="color: #60a5fa;">/file/SOUL.md</a> - 读取 SOUL</li>
-<li><a href="/skills" style="color: #60a5fa;">/skills</a> - 技能列表</li>
-<li><a href="/all" style="color: #60a5fa;">/all</a> - 所有数据</li>
-</ul>
-
-<h3 style="color: #10b981;">🛠️ 工具执行 (POST)</h3>
-<ul>
-<li><code>/api/tools/execute</code> - 执行工具</li>
-<li>支持: readFile, writeFile, listDir, runCmd, appendFile</li>
-</ul>
-</div>
-
-<h2>🧪 测试</h2>
-<pre style="background: #1e293b; padding: 15px; border-radius: 8px; overflow-x: auto;">
-curl -X POST http://localhost:3001/api/tools/execute \\
-  -H "Content-Type: application/json" \\
-  -d '{{"name": "listDir", "args": {{"path": "."}}}}'
-</pre>
-</body>
-</html>"""
+        # 优先托管前端 dist/index.html (便携式分发模式)，内容按 mtime/size 缓存为 bytes
+        body = read_dist_index()
+        if body is None:
+            # dist 不存在时显示 API 文档页 (启动时已渲染为 bytes)
+            body = self.index_html
         
         self.send_response(200)
         self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
         self.send_cors_headers()
         self.end_headers()
-        self.wfile.write(html.encode('utf-8'))
+        self.wfile.write(body)
     
     def handle_status(self):
         files = list_files(self.clawd_path)
-        skills_dir = self.clawd_path / 'skills'
-        skill_count = len(list(skills_dir.iterdir())) if skills_dir.exists() else 0
+        skill_count = 0
+        try:
+            with os.scandir(self.skills_dir) as it:
+                skill_count = sum(1 for _ in it)
+        except OSError:
+            pass
         
         self.send_json({
             'status': 'ok',
@@ -3715,43 +3805,71 @@ curl -X POST http://localhost:3001/api/tools/execute \\
             'tools': [t['name'] for t in self.registry.list_all()],
             'toolCount': len(self.registry.list_all()),
             'timestamp': datetime.now().isoformat()
-        })
+        }, pretty=True)
     
     def handle_files(self):
         files = list_files(self.clawd_path)
         self.send_json(files)
     
     def handle_file(self, filename):
-        filepath = self.clawd_path / filename
-        if not filepath.exists():
-            self.send_error_json(f'File not found: {filename}', 404)
-            return
-        
-        if not filepath.is_file():
-            self.send_error_json(f'Not a file: {filename}', 400)
+        # 纯字符串校验: 空段 (含开头的 /)、..、隐藏文件、NUL 在触碰文件系统前直接拒绝
+        parts = filename.replace('\\', '/').split('/')
+        if '\0' in filename or any(not part or part.startswith('.') for part in parts):
+            self.send_error_json('Access denied', 403)
             return
         
+        filepath = self.clawd_path / filename
         try:
-            filepath.resolve().relative_to(self.clawd_path.resolve())
-        except ValueError:
-            self.send_error_json('Access denied', 403)
-            return
+            st = os.lstat(filepath)
+        except OSError:
+            st = None
+        
+        # 根目录下的普通文件 (非符号链接) 必然在根目录内，一次 lstat 即可；
+        # 子目录路径或符号链接才需要 resolve (readlink 链) 后比较前缀
+        if not (len(parts) == 1 and st is not None and stat.S_ISREG(st.st_mode)):
+            if not filepath.exists():
+                self.send_error_json(f'File not found: {filename}', 404)
+                return
+            
+            if not filepath.is_file():
+                self.send_error_json(f'Not a file: {filename}', 400)
+                return
+            
+            # clawd 根目录在启动时已 resolve，这里只需一次字符串前缀比较
+            if not str(filepath.resolve()).startswith(self.clawd_prefix):
+                self.send_error_json('Access denied', 403)
+                return
         
         try:
-            content = filepath.read_text(encoding='utf-8')
-            self.send_text(content)
+            f = open(filepath, 'rb')
         except Exception as e:
             self.send_error_json(f'Read error: {str(e)}', 500)
+            return
+        
+        # 原样转发字节，不经过 str 解码/再编码
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Content-Length', str(size))
+            self.send_cors_headers()
+            self.end_headers()
+            self.send_file_body(f, size)
     
     def handle_skills(self):
         """GET /skills - 统一从 SKILL.md frontmatter 扫描所有技能，支持用户目录 + 项目目录"""
+        body = fresh_cached_body('skills')
+        if body is not None:
+            self.send_json_body(body)
+            return
+        
         skills = []
         seen = set()
         seen_ids = set()  # 防止重复技能 (用户目录优先)
         
         # 获取技能目录列表：用户目录优先，项目目录作为后备
         skills_dirs = []
-        user_skills_dir = self.clawd_path / 'skills'
+        user_skills_dir = self.skills_dir
         if user_skills_dir.exists() and user_skills_dir.is_dir():
             skills_dirs.append(('user', user_skills_dir))
         
@@ -3764,9 +3882,22 @@ curl -X POST http://localhost:3001/api/tools/execute \\
             self.send_json([])
             return
 
-        for source, skills_dir in skills_dirs:
+        scanned = [(source, skills_dir, *scan_skill_files(skills_dir)) for source, skills_dir in skills_dirs]
+
+        # SKILL.md / manifest.json 均未变化时直接返回上次序列化的结果
+        cache_key = tuple(
+            (source, file_signature(skill_mds), file_signature(manifest_paths))
+            for source, _, skill_mds, manifest_paths in scanned
+        )
+        cached = _response_cache.get('skills')
+        if cached and cached[0] == cache_key:
+            _response_cache['skills'] = (cache_key, cached[1], time.monotonic())
+            self.send_json_body(cached[1])
+            return
+
+        for source, skills_dir, skill_mds, manifest_paths in scanned:
             # ── 统一扫描 SKILL.md ──
-            for skill_md in skills_dir.rglob('SKILL.md'):
+            for skill_md in skill_mds:
                 skill_dir = skill_md.parent
                 dir_key = str(skill_dir.resolve())
                 skill_id = skill_dir.name
@@ -3807,15 +3938,16 @@ curl -X POST http://localhost:3001/api/tools/execute \\
                 if frontmatter.get('dangerLevel'):
                     skill_data['dangerLevel'] = frontmatter['dangerLevel']
 
-                # 无 frontmatter description 时提取正文首段
+                # 无 frontmatter description 时提取正文首段 (逐行读取，命中即停，不解码整个文件；
+                # 仅用于展示，非法字节替换而非整段丢弃)
                 if not skill_data['description']:
                     try:
-                        content = skill_md.read_text(encoding='utf-8')
-                        for line in content.split('\n'):
-                            line = line.strip()
-                            if line and not line.startswith('#') and not line.startswith('---'):
-                                skill_data['description'] = line[:200]
-                                break
+                        with open(skill_md, 'r', encoding='utf-8', errors='replace') as f:
+                            for line in f:
+                                line = line.strip()
+                                if line and not line.startswith('#') and not line.startswith('---'):
+                                    skill_data['description'] = line[:200]
+                                    break
                     except Exception:
                         pass
 
@@ -3858,7 +3990,7 @@ curl -X POST http://localhost:3001/api/tools/execute \\
                 skills.append(skill_data)
 
             # ── Deprecated fallback: manifest.json (兼容无 SKILL.md 的第三方技能) ──
-            for manifest_path in skills_dir.rglob('manifest.json'):
+            for manifest_path in manifest_paths:
                 skill_dir = manifest_path.parent
                 dir_key = str(skill_dir.resolve())
                 skill_id = skill_dir.name
@@ -3898,7 +4030,9 @@ curl -X POST http://localhost:3001/api/tools/execute \\
 
                 skills.append(skill_data)
 
-        self.send_json(skills)
+        body = encode_json(skills)
+        _response_cache['skills'] = (cache_key, body, time.monotonic())
+        self.send_json_body(body)
 
     # ============================================
     # 🌌 Nexus 管理
@@ -4654,6 +4788,7 @@ curl -X POST http://localhost:3001/api/tools/execute \\
         desc = skill.get('description', '').lower()
         keywords = [k.lower() for k in skill.get('keywords', [])]
         full_text = f"{name} {desc} {' '.join(keywords)}"
+        keyword_set = set(keywords)  # 每个 token 的精确匹配 O(1) 查找
         
         for token in tokens:
             # 词频 (TF)
@@ -4665,7 +4800,7 @@ curl -X POST http://localhost:3001/api/tools/execute \\
             # 精确匹配加权
             if token in name:
                 score += 10
-            if token in keywords:
+            if token in keyword_set:
                 score += 5
         
         return min(score, 100)
@@ -4677,6 +4812,7 @@ curl -X POST http://localhost:3001/api/tools/execute \\
         desc = server.get('description', '').lower()
         keywords = [k.lower() for k in server.get('keywords', [])]
         full_text = f"{name} {desc} {' '.join(keywords)}"
+        keyword_set = set(keywords)  # 每个 token 的精确匹配 O(1) 查找
         
         for token in tokens:
             tf = full_text.count(token)
@@ -4685,7 +4821,7 @@ curl -X POST http://localhost:3001/api/tools/execute \\
             
             if token in name:
                 score += 10
-            if token in keywords:
+            if token in keyword_set:
                 score += 5
         
         return min(score, 100)
@@ -4750,7 +4886,7 @@ curl -X POST http://localhost:3001/api/tools/execute \\
     # ============================================
 
     def handle_skill_install(self, data):
-        """POST /skills/install - 从 Git URL 安装技能"""
+        """POST /skills/install - 从 Git URL 安装技能 (异步，返回 installId 供轮询)"""
         source = data.get('source', '')
         name = data.get('name', '')
 
@@ -4762,69 +4898,61 @@ curl -X POST http://localhost:3001/api/tools/execute \\
             self.send_error_json('Unsupported source format. Use a Git URL (https://... or git@...)', 400)
             return
 
-        try:
-            # 从 URL 提取仓库名
-            match = re.search(r'/([^/]+?)(?:\.git)?$', source)
-            repo_name = name or (match.group(1) if match else 'downloaded-skill')
-            # 安全化名称
-            repo_name = re.sub(r'[^\w\-.]', '_', repo_name)
-
-            target = self.clawd_path / 'skills' / repo_name
-            if target.exists():
-                self.send_error_json(f'Skill already exists: {repo_name}. Use /skills/uninstall first.', 409)
-                return
-
-            # 确保 skills/ 目录存在
-            (self.clawd_path / 'skills').mkdir(parents=True, exist_ok=True)
+        # 从 URL 提取仓库名
+        match = re.search(r'/([^/]+?)(?:\.git)?$', source)
+        repo_name = name or (match.group(1) if match else 'downloaded-skill')
+        # 安全化名称
+        repo_name = re.sub(r'[^\w\-.]', '_', repo_name)
 
-            # Git clone (shallow, 限制深度)
-            process = subprocess.run(
-                ['git', 'clone', '--depth', '1', source, str(target)],
-                capture_output=True,
-                text=True,
-                timeout=120,
-            )
-
-            if process.returncode != 0:
-                # 清理失败的 clone
-                if target.exists():
-                    shutil.rmtree(target, ignore_errors=True)
-                stderr = process.stderr[:500] if process.stderr else 'Unknown error'
-                raise RuntimeError(f"git clone failed: {stderr}")
+        target = self.clawd_path / 'skills' / repo_name
+        if target.exists():
+            self.send_error_json(f'Skill already exists: {repo_name}. Use /skills/uninstall first.', 409)
+            return
 
-            # 验证: 必须有 SKILL.md (manifest.json 已 deprecated)
-            has_skill_md = (target / 'SKILL.md').exists() or any(target.rglob('SKILL.md'))
-            has_manifest = (target / 'manifest.json').exists()
+        install_id = str(uuid.uuid4())[:8]
+        with self.skill_installs_lock:
+            self.skill_installs[install_id] = {
+                'installId': install_id,
+                'status': 'running',
+                'phase': 'cloning',
+                'name': repo_name,
+                'path': str(target),
+                'created': time.monotonic(),  # 供 prune_skill_installs 使用，不返回给前端
+            }
+            publish_status('install', install_id, self.skill_installs[install_id])
+        if len(self.skill_installs) > MAX_TASKS:
+            prune_skill_installs()
 
-            if not has_skill_md:
-                if has_manifest:
-                    print(f"[SkillInstall] ⚠️ DEPRECATED: {target.name} only has manifest.json, please add SKILL.md")
-                else:
-                    shutil.rmtree(target, ignore_errors=True)
-                    self.send_error_json('Invalid skill: no SKILL.md found', 400)
-                    return
+        # git clone 可能耗时数十秒，放到后台线程，避免占用请求线程
+        thread = threading.Thread(
+            target=run_skill_install_in_background,
+            args=(install_id, source, repo_name, target, self.registry),
+            daemon=True,
+        )
+        thread.start()
 
-            # 重新扫描注册
-            self.registry.plugin_tools.clear()
-            self.registry.instruction_tools.clear()
-            self.registry.scan_plugins()
+        self.send_json({
+            'installId': install_id,
+            'status': 'running',
+            'phase': 'cloning',
+            'name': repo_name,
+        })
 
-            self.send_json({
-                'status': 'ok',
-                'name': repo_name,
-                'path': str(target),
-                'message': f'Skill installed: {repo_name}',
-                'toolCount': len(self.registry.list_all()),
-            })
+    def handle_skill_install_status(self, install_id):
+        """GET /skills/install/<id> - 查询技能安装进度"""
+        with self.skill_installs_lock:
+            install = self.skill_installs.get(install_id)
+            install = dict(install) if install else None
+        if not install:
+            # --workers > 1: 安装可能由其他 worker 进程发起
+            install = load_status('install', install_id)
+
+        if not install:
+            self.send_error_json(f'Install not found: {install_id}', 404)
+            return
 
-        except subprocess.TimeoutExpired:
-            if target.exists():
-                shutil.rmtree(target, ignore_errors=True)
-            self.send_error_json('Git clone timed out (120s limit)', 500)
-        except RuntimeError as e:
-            self.send_error_json(str(e), 500)
-        except Exception as e:
-            self.send_error_json(f'Installation failed: {str(e)}', 500)
+        install.pop('created', None)
+        self.send_json(install)
 
     def handle_skill_uninstall(self, data):
         """POST /skills/uninstall - 卸载技能"""
@@ -5381,32 +5509,48 @@ curl -X POST http://localhost:3001/api/tools/execute \\
     def handle_memories(self):
         memories = []
         
-        memory_md = self.clawd_path / 'MEMORY.md'
-        if memory_md.exists():
+        body = fresh_cached_body('memories')
+        if body is not None:
+            self.send_json_body(body)
+            return
+        
+        memory_md = self.memory_md_path
+        try:
+            with os.scandir(self.memory_dir) as it:
+                entries = [e for e in it if e.name.endswith('.md') and e.is_file()]
+        except OSError:
+            entries = []
+        
+        # MEMORY.md 与 memory/*.md 都未变化时直接返回缓存
+        cache_key = (
+            file_signature([memory_md]),
+            tuple((e.name, e.stat().st_mtime_ns, e.stat().st_size) for e in entries),
+        )
+        cached = _response_cache.get('memories')
+        if cached and cached[0] == cache_key:
+            _response_cache['memories'] = (cache_key, cached[1], time.monotonic())
+            self.send_json_body(cached[1])
+            return
+        
+        memories.extend(load_memory_md(self.memory_md_path))
+        
+        for entry in entries:
             try:
-                content = memory_md.read_text(encoding='utf-8')
-                memories.extend(parse_memory_md(content))
+                stem = entry.name[:-3]
+                memories.append({
+                    'id': f'file-{stem}',
+                    'title': stem.replace('-', ' ').replace('_', ' ').title(),
+                    'content': read_text_head(entry.path, 500),
+                    'type': 'long-term',
+                    'timestamp': entry.stat().st_mtime,
+                    'tags': [],
+                })
             except:
                 pass
         
-        memory_dir = self.clawd_path / 'memory'
-        if memory_dir.exists() and memory_dir.is_dir():
-            for item in memory_dir.iterdir():
-                if item.is_file() and item.suffix == '.md':
-                    try:
-                        content = item.read_text(encoding='utf-8')
-                        memories.append({
-                            'id': f'file-{item.stem}',
-                            'title': item.stem.replace('-', ' ').replace('_', ' ').title(),
-                            'content': content[:500],
-                            'type': 'long-term',
-                            'timestamp': item.stat().st_mtime,
-                            'tags': [],
-                        })
-                    except:
-                        pass
-        
-        self.send_json(memories)
+        body = encode_json(memories)
+        _response_cache['memories'] = (cache_key, body, time.monotonic())
+        self.send_json_body(body)
     
     def handle_all(self):
         data = {
@@ -5417,38 +5561,23 @@ curl -X POST http://localhost:3001/api/tools/execute \\
             'files': list_files(self.clawd_path),
         }
         
-        soul_path = self.clawd_path / 'SOUL.md'
-        if soul_path.exists():
-            try:
-                data['soul'] = soul_path.read_text(encoding='utf-8')
-            except:
-                pass
+        data['soul'] = read_text_cached(self.soul_path)
+        data['identity'] = read_text_cached(self.identity_path)
         
-        identity_path = self.clawd_path / 'IDENTITY.md'
-        if identity_path.exists():
-            try:
-                data['identity'] = identity_path.read_text(encoding='utf-8')
-            except:
-                pass
+        try:
+            with os.scandir(self.skills_dir) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        data['skills'].append({
+                            'name': entry.name,
+                            'location': 'local',
+                            'status': 'active',
+                            'enabled': True,
+                        })
+        except OSError:
+            pass
         
-        skills_dir = self.clawd_path / 'skills'
-        if skills_dir.exists():
-            for item in skills_dir.iterdir():
-                if item.is_dir():
-                    data['skills'].append({
-                        'name': item.name,
-                        'location': 'local',
-                        'status': 'active',
-                        'enabled': True,
-                    })
-        
-        memory_md = self.clawd_path / 'MEMORY.md'
-        if memory_md.exists():
-            try:
-                content = memory_md.read_text(encoding='utf-8')
-                data['memories'] = parse_memory_md(content)
-            except:
-                pass
+        data['memories'] = load_memory_md(self.memory_md_path)
         
         self.send_json(data)
     
@@ -5461,17 +5590,14 @@ curl -X POST http://localhost:3001/api/tools/execute \\
         
         task_id = str(uuid.uuid4())[:8]
         
-        thread = threading.Thread(
-            target=run_task_in_background,
-            args=(task_id, prompt, self.clawd_path),
-            daemon=True,
-        )
-        thread.start()
+        # 先登记再入队，排队期间轮询也能查到任务 (对前端而言仍是 running)
+        store_task(TaskState(task_id=task_id, status='running', log_path=None))
+        if len(self.tasks) > MAX_TASKS:
+            prune_tasks()
+        _task_queue.put((task_id, prompt, self.clawd_path))
         
-        self.send_json({
-            'taskId': task_id,
-            'status': 'running',
-        })
+        # task_id 为 uuid 十六进制片段，无需转义可直接拼接
+        self.send_json_body(b'{"taskId":"%s","status":"running"}' % task_id.encode('ascii'))
     
     # ============================================
     # 🤖 子代理 API 处理器 (Quest 模式支持)
@@ -5606,30 +5732,24 @@ curl -X POST http://localhost:3001/api/tools/execute \\
                 try:
                     for chunk in resp.iter_content(chunk_size=None):
                         if chunk:
-                            # HTTP chunked encoding: size\r\ndata\r\n
-                            chunk_data = chunk
-                            self.wfile.write(f'{len(chunk_data):x}\r\n'.encode())
-                            self.wfile.write(chunk_data)
-                            self.wfile.write(b'\r\n')
-                            self.wfile.flush()
+                            # HTTP chunked encoding: size\r\ndata\r\n，拼成一次写入 (wfile 无缓冲，每次 write 即一次 send)
+                            self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
                     # 终止 chunk
                     self.wfile.write(b'0\r\n\r\n')
-                    self.wfile.flush()
                 except (BrokenPipeError, ConnectionResetError):
-                    pass  # 客户端断开
+                    self.close_connection = True  # 客户端断开
+                except req_lib.exceptions.RequestException as e:
+                    # 上游中途断流: 响应头和部分 chunk 已发出，无法再返回错误 JSON；
+                    # 不发终止 chunk 并关闭连接，前端会看到流被截断
+                    print(f'[LLM Proxy] Stream aborted: {type(e).__name__}: {e}', file=sys.stderr)
+                    self.close_connection = True
                 finally:
                     resp.close()
             else:
                 # 非流式: 直接转发响应
                 if resp.ok:
-                    try:
-                        self.send_json(resp.json())
-                    except Exception:
-                        self.send_response(resp.status_code)
-                        self.send_header('Content-Type', 'application/json')
-                        self.send_header('Access-Control-Allow-Origin', '*')
-                        self.end_headers()
-                        self.wfile.write(resp.content)
+                    # 上游 JSON 原样转发，不做解析再序列化
+                    self.send_json_body(resp.content)
                 else:
                     error_text = resp.text[:500]
                     print(f'[LLM Proxy] HTTP error: {resp.status_code} - {error_text}', file=sys.stderr)
@@ -5648,100 +5768,498 @@ curl -X POST http://localhost:3001/api/tools/execute \\
             session.close()
 
     def handle_task_status(self, task_id, offset=0):
-        with self.tasks_lock:
-            task = self.tasks.get(task_id)
+        task = self.tasks.get(task_id) or load_shared_task(task_id)
         
         if not task:
             self.send_error_json(f'Task not found: {task_id}', 404)
             return
         
-        log_path = task.get('logPath')
+        log_path = task.log_path
         content = ''
         new_offset = offset
         has_more = False
-        file_size = task.get('fileSize', 0)
-        
-        if log_path:
-            content, new_offset, has_more = read_log_chunk(log_path, offset)
-            try:
-                file_size = Path(log_path).stat().st_size
-            except:
-                pass
-        
-        self.send_json({
-            'taskId': task_id,
-            'status': task['status'],
-            'content': content,
-            'offset': new_offset,
-            'hasMore': has_more,
-            'fileSize': file_size,
-        })
+        file_size = task.file_size
+        
+        # 运行中的任务按需 stat 日志；已结束任务的 file_size 是最终值，offset 追上后无需再读
+        if log_path and (task.status == 'running' or offset < file_size):
+            expected_size = None if task.status == 'running' else task.file_size
+            content, new_offset, has_more, file_size = read_log_chunk(
+                log_path, offset, expected_size=expected_size)
+        
+        # 高频轮询路径: 字段固定，只有日志内容需要 JSON 转义；
+        # taskId 来自任务表 (uuid 十六进制)，status 为固定枚举，可直接拼接
+        self.send_json_body(
+            b'{"taskId":"%s","status":"%s","content":%s,"offset":%d,"hasMore":%s,"fileSize":%d}' % (
+                task.task_id.encode('ascii'),
+                task.status.encode('ascii'),
+                encode_json(content),
+                new_offset,
+                b'true' if has_more else b'false',
+                file_size,
+            )
+        )
+
+
+class DunCrewHTTPServer(ThreadingHTTPServer):
+    """每个连接一个线程；前端会并发轮询多个接口，放大 listen backlog (默认 5)"""
+    daemon_threads = True
+    request_queue_size = 64
+    allow_reuse_port = False
+
+    def server_bind(self):
+        # socketserver 直到 Python 3.11 才支持 allow_reuse_port，这里手动设置以兼容 3.10
+        if self.allow_reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+# 父进程 fork 出的 worker 子进程 PID (子进程中为空)
+_worker_pids = []
+
+
+def fork_workers(count):
+    """--workers: fork 出 count-1 个子进程，各自独立初始化并以 SO_REUSEPORT 绑定同一端口，
+    由内核在多个解释器间分发连接 (绕开单进程 GIL)。必须在创建线程/数据库连接/MCP 子进程之前调用"""
+    if not hasattr(os, 'fork') or not hasattr(socket, 'SO_REUSEPORT'):
+        print("[Workers] --workers requires fork() and SO_REUSEPORT, running a single process", file=sys.stderr)
+        return
+    
+    DunCrewHTTPServer.allow_reuse_port = True
+    for _ in range(count - 1):
+        pid = os.fork()
+        if pid == 0:
+            # 后台启动时 SIGINT 可能被继承为忽略，恢复默认以便父进程转发的 Ctrl+C 生效
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            _worker_pids.clear()
+            return
+        _worker_pids.append(pid)
+    
+    # 父进程：把 SIGINT/SIGTERM 转发给子进程，再按 Ctrl+C 的路径退出
+    signal.signal(signal.SIGINT, _forward_worker_signal)
+    signal.signal(signal.SIGTERM, _forward_worker_signal)
+
+
+def _signal_workers(signum, frame):
+    for pid in _worker_pids:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def _forward_worker_signal(signum, frame):
+    _signal_workers(signum, frame)
+    raise KeyboardInterrupt
+
+
+def reap_workers():
+    """等待所有 worker 子进程退出，避免留下僵尸进程"""
+    if not _worker_pids:
+        return
+    # 关闭期间再收到信号只转发给子进程，不再打断 waitpid
+    signal.signal(signal.SIGINT, _signal_workers)
+    signal.signal(signal.SIGTERM, _signal_workers)
+    for pid in _worker_pids:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    _worker_pids.clear()
 
 
 # ============================================
 # 辅助函数
 # ============================================
 
+def encode_json(data, pretty=False):
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2 if pretty else 0)
+        except TypeError:
+            pass  # orjson 不支持的类型 (如超 64 位整数) 交给标准库
+    if pretty:
+        return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def decode_json(body):
+    """解析请求体 bytes；格式错误抛出 ValueError (含 UnicodeDecodeError)"""
+    if HAS_ORJSON:
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            pass  # 超 64 位整数等 orjson 拒绝的输入交给标准库判定
+    return json.loads(body.decode('utf-8'))
+
+
+# 已序列化响应缓存: name -> (cache_key, body, checked_at)，整体替换 tuple 保证读到的字段一致
+_response_cache = {}
+CACHE_TTL = 2.0  # 秒，由 --cache-ttl 覆盖；窗口内直接复用缓存，不再扫描目录校验
+
+
+def fresh_cached_body(name):
+    """CACHE_TTL 窗口内校验过的缓存 body，过期或不存在返回 None"""
+    cached = _response_cache.get(name)
+    if cached and time.monotonic() - cached[2] < CACHE_TTL:
+        return cached[1]
+    return None
+
+
+def invalidate_cache(*names):
+    for name in names:
+        _response_cache.pop(name, None)
+
+
+def file_signature(paths):
+    """文件列表的 (path, mtime_ns, size) 签名，用作缓存失效判断；不存在的文件记为 None"""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((str(path), st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append((str(path), None, None))
+    return tuple(signature)
+
+
+# list_files 缓存: 目录 mtime 不变时直接复用上次的排序结果
+# 存为 (path, mtime, files) tuple 并整体替换，并发请求线程不会读到 mtime 与 files 不匹配的中间状态
+_files_cache = (None, 0, ())
+
+
+# dist/index.html 缓存: ((mtime_ns, size), bytes)
+_dist_index_cache = (None, b'')
+
+
+def read_dist_index():
+    """返回 dist/index.html 的 bytes，文件未变化时复用缓存；不存在返回 None"""
+    global _dist_index_cache
+    index_file = APP_DIR / 'dist' / 'index.html'
+    try:
+        st = os.stat(index_file)
+    except OSError:
+        return None
+    
+    key = (st.st_mtime_ns, st.st_size)
+    cached_key, cached_body = _dist_index_cache
+    if cached_key == key:
+        return cached_body
+    
+    try:
+        with open(index_file, 'rb') as f:
+            body = f.read()
+    except OSError:
+        return None
+    _dist_index_cache = (key, body)
+    return body
+
+
 def list_files(clawd_path):
+    global _files_cache
+    try:
+        mtime = os.stat(clawd_path).st_mtime_ns
+    except OSError:
+        return []
+    
+    cached_path, cached_mtime, cached_files = _files_cache
+    if cached_path == clawd_path and cached_mtime == mtime:
+        return list(cached_files)
+    
     files = []
     try:
-        for item in clawd_path.iterdir():
-            if item.is_file():
-                files.append(item.name)
-    except:
+        with os.scandir(clawd_path) as it:
+            for entry in it:
+                if entry.is_file():
+                    files.append(entry.name)
+    except OSError:
         pass
-    return sorted(files)
+    files.sort()
+    
+    _files_cache = (clawd_path, mtime, tuple(files))
+    return files
+
+
+def scan_skill_files(skills_dir):
+    """一次 scandir 遍历同时收集 SKILL.md 与 manifest.json (替代两次 rglob)"""
+    skill_mds = []
+    manifests = []
+    stack = [str(skills_dir)]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            # 与 rglob 一致: 不进入符号链接目录 (避免 pnpm node_modules 等链接成环)，
+            # 单个条目 stat 失败时跳过
+            try:
+                if entry.name == 'SKILL.md' and entry.is_file():
+                    skill_mds.append(Path(entry.path))
+                elif entry.name == 'manifest.json' and entry.is_file():
+                    manifests.append(Path(entry.path))
+                elif (entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.')
+                        and entry.name != '__pycache__'):
+                    subdirs.append(entry.path)
+            except OSError:
+                continue
+        stack.extend(reversed(subdirs))
+    return skill_mds, manifests
+
+
+# MEMORY.md 的行首 "## " 标题
+MEMORY_HEADING_RE = re.compile(r'^## ([^\n]*)', re.MULTILINE)
 
 
 def parse_memory_md(content):
+    """按行首 "## " 切分 MEMORY.md；标题由预编译正则一次扫描定位，正文取去空白后的前 500 字符"""
     memories = []
-    sections = content.split('## ')
+    headings = list(MEMORY_HEADING_RE.finditer(content))
     
-    for i, section in enumerate(sections[1:], 1):
-        lines = section.strip().split('\n')
-        if not lines:
+    for i, match in enumerate(headings, 1):
+        title = match.group(1).strip()
+        if not title:
             continue
         
-        title = lines[0].strip()
-        body = '\n'.join(lines[1:]).strip()
+        end = headings[i].start() if i < len(headings) else len(content)
+        body = content[match.end():end].strip()[:500]
         
-        if title:
-            memories.append({
-                'id': f'memory-{i}',
-                'title': title,
-                'content': body[:500] if body else title,
-                'type': 'long-term',
-                'timestamp': None,
-                'tags': [],
-            })
+        memories.append({
+            'id': f'memory-{i}',
+            'title': title,
+            'content': body if body else title,
+            'type': 'long-term',
+            'timestamp': None,
+            'tags': [],
+        })
     
     return memories
 
 
-def read_log_chunk(log_path, offset=0, max_bytes=51200):
-    path = Path(log_path)
-    if not path.exists():
-        return ('', offset, False)
+def read_text_head(path, max_chars):
+    """只读取文件开头足够解码出 max_chars 个字符的字节 (UTF-8 每字符至多 4 字节)，
+    结果与 open(path, encoding='utf-8').read()[:max_chars] 一致 (含换行符转换)"""
+    with open(path, 'rb') as f:
+        head = f.read(max_chars * 4 + 8)
+    # 增量解码器 final=False: 末尾被截断的半个字符留在缓冲区，中间的非法字节照常抛出 UnicodeDecodeError
+    text = codecs.getincrementaldecoder('utf-8')().decode(head)
+    return text.replace('\r\n', '\n').replace('\r', '\n')[:max_chars]
+
+
+# 小文本文件缓存: path -> ((mtime_ns, size), text)
+_text_cache = {}
+
+
+def read_text_cached(path):
+    """读取 UTF-8 文本，mtime/size 未变化时复用上次解码结果；不存在或读取失败返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _text_cache.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    
+    try:
+        text = Path(path).read_text(encoding='utf-8')
+    except (OSError, UnicodeDecodeError):
+        return None
+    _text_cache[path] = (key, text)
+    return text
+
+
+# MEMORY.md 解析结果缓存: (file_signature, memories)
+_memory_md_cache = (None, ())
+
+
+def load_memory_md(memory_md):
+    """解析 MEMORY.md (handle_memories / handle_all 共用)，文件未变化时复用上次的解析结果"""
+    global _memory_md_cache
+    signature = file_signature([memory_md])
+    cached_signature, cached_memories = _memory_md_cache
+    if cached_signature == signature:
+        return list(cached_memories)
     
+    memories = []
+    if signature[0][1] is not None:
+        try:
+            memories = parse_memory_md(memory_md.read_text(encoding='utf-8'))
+        except:
+            pass
+    _memory_md_cache = (signature, tuple(memories))
+    return memories
+
+
+# 运行中任务的日志大小缓存: log_path -> (monotonic 时间, size)，高频轮询时 100ms 内复用
+_log_size_cache = {}
+LOG_SIZE_FRESHNESS = 0.1
+
+
+def _log_file_size(log_path):
+    now = time.monotonic()
+    cached = _log_size_cache.get(log_path)
+    if cached and now - cached[0] < LOG_SIZE_FRESHNESS:
+        return cached[1]
     try:
-        file_size = path.stat().st_size
-    except:
-        return ('', offset, False)
+        size = os.stat(log_path).st_size
+    except OSError:
+        return None
+    _log_size_cache[log_path] = (now, size)
+    return size
+
+
+def read_log_chunk(log_path, offset=0, max_bytes=51200, expected_size=None):
+    """读取日志片段，返回 (content, new_offset, has_more, file_size)
+
+    expected_size: 已结束任务的最终日志大小，传入时不再 stat 日志文件
+    """
+    if expected_size is not None:
+        file_size = expected_size
+        _log_size_cache.pop(log_path, None)
+    else:
+        file_size = _log_file_size(log_path)
+        if file_size is None:
+            return ('', offset, False, 0)
     
     if offset >= file_size:
-        return ('', offset, False)
+        return ('', offset, False, file_size)
     
     try:
-        with open(path, 'rb') as f:
+        with open(log_path, 'rb') as f:
             f.seek(offset)
             raw = f.read(max_bytes)
         
         content = raw.decode('utf-8', errors='replace')
         new_offset = offset + len(raw)
+        file_size = max(file_size, new_offset)  # 缓存的 size 可能略旧
         has_more = new_offset < file_size
-        return (content, new_offset, has_more)
+        return (content, new_offset, has_more, file_size)
     except Exception as e:
-        return (f'[日志读取错误: {e}]', offset, False)
+        return (f'[日志读取错误: {e}]', offset, False, file_size)
+
+
+# --workers > 1 时任务/安装状态另写一份 JSON 到 logs/status/，轮询请求被内核分发到
+# 其他 worker 进程时也能查到；单进程时为 None，不落盘
+_shared_status_dir = None
+STATUS_ID_RE = re.compile(r'[0-9a-f]{8}')  # taskId / installId 均为 uuid 前 8 位
+
+
+def init_shared_status(clawd_path):
+    """在 fork 前调用：清掉上次运行残留的状态文件"""
+    global _shared_status_dir
+    status_dir = clawd_path / 'logs' / 'status'
+    shutil.rmtree(status_dir, ignore_errors=True)
+    status_dir.mkdir(parents=True, exist_ok=True)
+    _shared_status_dir = status_dir
+
+
+def publish_status(kind, key, record):
+    if _shared_status_dir is None:
+        return
+    path = _shared_status_dir / f'{kind}-{key}.json'
+    # 先写临时文件再 rename，读者不会看到写了一半的 JSON
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    try:
+        tmp.write_bytes(encode_json(record))
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[Status] Failed to publish {kind} {key}: {e}", file=sys.stderr)
+
+
+def load_status(kind, key):
+    if _shared_status_dir is None or not STATUS_ID_RE.fullmatch(key):
+        return None
+    try:
+        return decode_json((_shared_status_dir / f'{kind}-{key}.json').read_bytes())
+    except (OSError, ValueError):
+        return None
+
+
+def discard_status(kind, key):
+    if _shared_status_dir is None:
+        return
+    try:
+        (_shared_status_dir / f'{kind}-{key}.json').unlink(missing_ok=True)
+    except OSError:
+        pass
+
+
+def store_task(task):
+    ClawdDataHandler.tasks[task.task_id] = task
+    publish_status('task', task.task_id, {
+        'task_id': task.task_id,
+        'status': task.status,
+        'log_path': task.log_path,
+        'file_size': task.file_size,
+    })
+
+
+def load_shared_task(task_id):
+    """读取其他 worker 进程发布的任务状态，不存在时返回 None"""
+    record = load_status('task', task_id)
+    return TaskState(**record) if record else None
+
+
+def _update_task(task_id, **changes):
+    """以新的 TaskState 整体替换任务状态 (每个任务只有后台线程一个写者)"""
+    task = ClawdDataHandler.tasks.get(task_id)
+    if task is not None:
+        store_task(replace(task, **changes))
+
+
+# 任务表上限: 已结束任务保留 TASK_TTL 秒；总数超过 MAX_TASKS 时从最早的已结束任务开始淘汰
+# (技能安装记录 skill_installs 使用相同的上限)
+MAX_TASKS = 1024
+TASK_TTL = 3600
+TASK_SWEEP_INTERVAL = 60
+
+
+def prune_tasks():
+    tasks = ClawdDataHandler.tasks
+    now = time.monotonic()
+    excess = len(tasks) - MAX_TASKS
+    # dict 按插入顺序即创建顺序；list() 取快照，避免与请求线程的插入并发迭代
+    for task in list(tasks.values()):
+        if task.status == 'running':
+            continue
+        if excess > 0 or now - task.created > TASK_TTL:
+            tasks.pop(task.task_id, None)
+            discard_status('task', task.task_id)
+            excess -= 1
+
+
+def prune_skill_installs():
+    with ClawdDataHandler.skill_installs_lock:
+        installs = ClawdDataHandler.skill_installs
+        now = time.monotonic()
+        excess = len(installs) - MAX_TASKS
+        for install_id, install in list(installs.items()):
+            if install['status'] == 'running':
+                continue
+            if excess > 0 or now - install['created'] > TASK_TTL:
+                del installs[install_id]
+                discard_status('install', install_id)
+                excess -= 1
+
+
+def prune_log_size_cache():
+    """丢弃已过期的日志大小缓存 (已结束或已淘汰的任务不会再刷新其条目)"""
+    now = time.monotonic()
+    for log_path, (cached_at, _) in list(_log_size_cache.items()):
+        if now - cached_at >= LOG_SIZE_FRESHNESS:
+            _log_size_cache.pop(log_path, None)
+
+
+def task_sweeper():
+    while True:
+        time.sleep(TASK_SWEEP_INTERVAL)
+        prune_tasks()
+        prune_skill_installs()
+        prune_log_size_cache()
 
 
 def run_task_in_background(task_id, prompt, clawd_path):
@@ -5749,74 +6267,190 @@ def run_task_in_background(task_id, prompt, clawd_path):
     logs_dir.mkdir(exist_ok=True)
     log_file = logs_dir / f"{task_id}.log"
     
-    with ClawdDataHandler.tasks_lock:
-        ClawdDataHandler.tasks[task_id] = {
-            'taskId': task_id,
-            'status': 'running',
-            'logPath': str(log_file),
-            'fileSize': 0,
-        }
+    store_task(TaskState(
+        task_id=task_id,
+        status='running',
+        log_path=str(log_file),
+    ))
     
+    # 单个 O_APPEND fd 同时供 Popen 输出与错误信息追加，避免反复 open/close
     try:
-        with open(log_file, 'w', encoding='utf-8') as f:
-            f.write(f"Task: {prompt}\n")
-            f.write(f"Started: {datetime.now().isoformat()}\n")
-            f.write("-" * 50 + "\n\n")
+        fd = os.open(log_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+    except OSError:
+        _update_task(task_id, status='error')
+        return
+    
+    with os.fdopen(fd, 'wb', buffering=0) as log:
+        def append(text):
+            log.write(text.encode('utf-8'))
+        
+        def log_size():
+            return os.fstat(log.fileno()).st_size  # 已持有 fd，无需按路径 stat
         
-        # 尝试运行 clawdbot，如果不存在则模拟
         try:
-            with open(log_file, 'ab') as f:
+            append(f"Task: {prompt}\n")
+            append(f"Started: {datetime.now().isoformat()}\n")
+            append("-" * 50 + "\n\n")
+            
+            # 尝试运行 clawdbot，如果不存在则模拟
+            try:
                 process = subprocess.Popen(
                     ['clawdbot', 'agent', '--agent', 'main', '--message', prompt],
                     cwd=str(clawd_path),
-                    stdout=f,
+                    stdout=log,
                     stderr=subprocess.STDOUT,
                 )
                 
-                start_time = time.time()
                 timeout = 300
                 
-                while process.poll() is None:
-                    time.sleep(0.5)
-                    try:
-                        with ClawdDataHandler.tasks_lock:
-                            ClawdDataHandler.tasks[task_id]['fileSize'] = log_file.stat().st_size
-                    except:
-                        pass
-                    
-                    if time.time() - start_time > timeout:
-                        process.kill()
-                        process.wait()
-                        with ClawdDataHandler.tasks_lock:
-                            ClawdDataHandler.tasks[task_id]['status'] = 'error'
-                            ClawdDataHandler.tasks[task_id]['fileSize'] = log_file.stat().st_size
-                        with open(log_file, 'a', encoding='utf-8') as ef:
-                            ef.write(f'\n\n[错误] 任务执行超时 ({timeout}s)\n')
-                        return
+                # 日志大小由 handle_task_status 按需 stat，这里只需等待进程结束
+                try:
+                    process.wait(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+                    append(f'\n\n[错误] 任务执行超时 ({timeout}s)\n')
+                    _update_task(task_id, status='error', file_size=log_size())
+                    return
                 
-                process.wait()
-            
-            with ClawdDataHandler.tasks_lock:
-                ClawdDataHandler.tasks[task_id]['status'] = 'done' if process.returncode == 0 else 'error'
-                ClawdDataHandler.tasks[task_id]['fileSize'] = log_file.stat().st_size
-        
-        except FileNotFoundError:
-            # clawdbot 不存在，使用 Native 模式提示
-            with open(log_file, 'a', encoding='utf-8') as f:
-                f.write("\n[DunCrew Native] clawdbot 未安装。\n")
-                f.write("在 Native 模式下，请使用 /api/tools/execute 接口直接执行工具。\n")
-                f.write("\n任务已记录，等待 AI 引擎处理。\n")
+                _update_task(
+                    task_id,
+                    status='done' if process.returncode == 0 else 'error',
+                    file_size=log_size(),
+                )
             
-            with ClawdDataHandler.tasks_lock:
-                ClawdDataHandler.tasks[task_id]['status'] = 'done'
-                ClawdDataHandler.tasks[task_id]['fileSize'] = log_file.stat().st_size
-    
+            except FileNotFoundError:
+                # clawdbot 不存在，使用 Native 模式提示
+                append("\n[DunCrew Native] clawdbot 未安装。\n")
+                append("在 Native 模式下，请使用 /api/tools/execute 接口直接执行工具。\n")
+                append("\n任务已记录，等待 AI 引擎处理。\n")
+                
+                _update_task(task_id, status='done', file_size=log_size())
+        
+        except Exception as e:
+            append(f'\n\n[错误] {str(e)}\n')
+            _update_task(task_id, status='error', file_size=log_size())
+
+
+# /task/execute 任务队列: 由 TASK_WORKERS 个常驻线程消费，限制同时运行的 clawdbot 子进程数，
+# 请求线程入队后立即返回
+TASK_WORKERS = 1
+_task_queue = queue.Queue()
+
+
+def task_worker():
+    while True:
+        task_id, prompt, clawd_path = _task_queue.get()
+        try:
+            run_task_in_background(task_id, prompt, clawd_path)
+        except Exception as e:
+            print(f"[Task] {task_id} failed: {e}", file=sys.stderr)
+            _update_task(task_id, status='error')
+        finally:
+            _task_queue.task_done()
+
+
+def start_task_workers(count=TASK_WORKERS):
+    for i in range(count):
+        threading.Thread(target=task_worker, name=f'task-worker-{i}', daemon=True).start()
+    threading.Thread(target=task_sweeper, name='task-sweeper', daemon=True).start()
+
+
+SKILL_MD_SKIP_DIRS = {'node_modules', '__pycache__', 'venv', 'dist', 'build'}
+
+
+def find_skill_md(root, max_depth=3):
+    """在 root 下查找 SKILL.md，只向下探 max_depth 层并跳过 .git/node_modules 等目录
+
+    替代 any(root.rglob('SKILL.md'))，避免 clone 下来的大仓库被整棵遍历
+    """
+    stack = [(str(root), 0)]
+    while stack:
+        directory, depth = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.name == 'SKILL.md' and entry.is_file():
+                        return True
+                    if (depth < max_depth and entry.is_dir(follow_symlinks=False)
+                            and not entry.name.startswith('.')
+                            and entry.name not in SKILL_MD_SKIP_DIRS):
+                        stack.append((entry.path, depth + 1))
+        except OSError:
+            continue
+    return False
+
+
+def _update_skill_install(install_id, **fields):
+    with ClawdDataHandler.skill_installs_lock:
+        install = ClawdDataHandler.skill_installs[install_id]
+        install.update(fields)
+        publish_status('install', install_id, install)
+
+
+def run_skill_install_in_background(install_id, source, repo_name, target, registry):
+    """后台执行 git clone + 校验 + 重新扫描，进度写入 ClawdDataHandler.skill_installs"""
+    timeout = 120
+    try:
+        # 确保 skills/ 目录存在
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        # Git clone (shallow, 限制深度)
+        process = subprocess.Popen(
+            ['git', 'clone', '--depth', '1', source, str(target)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            _, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            shutil.rmtree(target, ignore_errors=True)
+            _update_skill_install(install_id, status='error', phase='error',
+                                  error=f'Git clone timed out ({timeout}s limit)')
+            return
+
+        if process.returncode != 0:
+            # 清理失败的 clone
+            shutil.rmtree(target, ignore_errors=True)
+            stderr = stderr[:500] if stderr else 'Unknown error'
+            _update_skill_install(install_id, status='error', phase='error',
+                                  error=f'git clone failed: {stderr}')
+            return
+
+        # 验证: 必须有 SKILL.md (manifest.json 已 deprecated)
+        _update_skill_install(install_id, phase='validating')
+        has_skill_md = find_skill_md(target)
+        has_manifest = (target / 'manifest.json').exists()
+
+        if not has_skill_md:
+            if has_manifest:
+                print(f"[SkillInstall] ⚠️ DEPRECATED: {target.name} only has manifest.json, please add SKILL.md")
+            else:
+                shutil.rmtree(target, ignore_errors=True)
+                _update_skill_install(install_id, status='error', phase='error',
+                                      error='Invalid skill: no SKILL.md found')
+                return
+
+        # 重新扫描注册
+        _update_skill_install(install_id, phase='scanning')
+        registry.plugin_tools.clear()
+        registry.instruction_tools.clear()
+        registry.scan_plugins()
+
+        _update_skill_install(
+            install_id,
+            status='done',
+            phase='done',
+            message=f'Skill installed: {repo_name}',
+            toolCount=len(registry.list_all()),
+        )
+
     except Exception as e:
-        with open(log_file, 'a', encoding='utf-8') as ef:
-            ef.write(f'\n\n[错误] {str(e)}\n')
-        with ClawdDataHandler.tasks_lock:
-            ClawdDataHandler.tasks[task_id]['status'] = 'error'
-            ClawdDataHandler.tasks[task_id]['fileSize'] = log_file.stat().st_size
+        _update_skill_install(install_id, status='error', phase='error',
+                              error=f'Installation failed: {str(e)}')
 
 
 def cleanup_old_logs(clawd_path, max_age_hours=24):
@@ -5866,27 +6500,35 @@ def cleanup_temp_uploads(clawd_path, max_age_hours=1):
     
     now = time.time()
     count = 0
-    for f in upload_dir.iterdir():
-        try:
-            if f.is_file() and (now - f.stat().st_mtime) > max_age_hours * 3600:
-                f.unlink()
-                count += 1
-        except:
-            pass
+    with os.scandir(upload_dir) as it:
+        for entry in it:
+            try:
+                if entry.is_file() and (now - entry.stat().st_mtime) > max_age_hours * 3600:
+                    os.unlink(entry.path)
+                    count += 1
+            except:
+                pass
     
     if count > 0:
         print(f"[Cleanup] Removed {count} old temp upload files")
 
 
 def main():
+    global CACHE_TTL
     parser = argparse.ArgumentParser(description='DunCrew Native Server')
     parser.add_argument('--port', type=int, default=3001, help='Server port (default: 3001)')
     # 支持环境变量覆盖默认路径
     default_path = os.getenv('DUNCREW_DATA_PATH', os.getenv('DDOS_DATA_PATH', '~/.duncrew'))
     parser.add_argument('--path', type=str, default=default_path, help='Data directory path (default: ~/.duncrew)')
     parser.add_argument('--host', type=str, default='0.0.0.0', help='Server host (default: 0.0.0.0)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Server processes sharing the port via SO_REUSEPORT (POSIX only, default: 1)')
+    parser.add_argument('--cache-ttl', type=float, default=CACHE_TTL,
+                        help=f'Seconds to serve /skills and /memories without rescanning (default: {CACHE_TTL})')
     args = parser.parse_args()
     
+    CACHE_TTL = max(0.0, args.cache_ttl)
+    
     clawd_path = Path(args.path).expanduser().resolve()
     
     if not clawd_path.exists():
@@ -5929,6 +6571,10 @@ You are DunCrew, a local AI operating system running directly on the user's comp
     
     cleanup_old_logs(clawd_path)
     
+    if args.workers > 1:
+        init_shared_status(clawd_path)
+        fork_workers(args.workers)
+    
     # 🔌 初始化工具注册表
     registry = ToolRegistry(clawd_path)
     # 注册内置工具
@@ -5958,11 +6604,19 @@ You are DunCrew, a local AI operating system running directly on the user's comp
     project_path = APP_DIR
     
     ClawdDataHandler.clawd_path = clawd_path
+    ClawdDataHandler.clawd_path_resolved = clawd_path.resolve()
+    ClawdDataHandler.clawd_prefix = str(ClawdDataHandler.clawd_path_resolved) + os.sep
+    ClawdDataHandler.soul_path = clawd_path / 'SOUL.md'
+    ClawdDataHandler.identity_path = clawd_path / 'IDENTITY.md'
+    ClawdDataHandler.memory_md_path = clawd_path / 'MEMORY.md'
+    ClawdDataHandler.memory_dir = memory_dir
+    ClawdDataHandler.skills_dir = skills_dir
+    ClawdDataHandler.index_html = INDEX_TEMPLATE.format(version=VERSION, path=clawd_path).encode('utf-8')
     ClawdDataHandler.project_path = project_path
     ClawdDataHandler.registry = registry
     ClawdDataHandler.subagent_manager = SubagentManager(registry)
     
-    server = ThreadingHTTPServer((args.host, args.port), ClawdDataHandler)
+    server = DunCrewHTTPServer((args.host, args.port), ClawdDataHandler)
     
     tool_names = [t['name'] for t in registry.list_all()]
     plugin_count = len(registry.plugin_tools)
@@ -5982,12 +6636,15 @@ You are DunCrew, a local AI operating system running directly on the user's comp
     
     print(f"Press Ctrl+C to stop\n")
     
+    start_task_workers()
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         print("\nShutting down...")
         _browser_manager.shutdown()
         server.shutdown()
+    finally:
+        reap_workers()
 
 
 if __name__ == '__main__':
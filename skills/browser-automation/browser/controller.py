@@ -6,7 +6,9 @@ Provides a persistent browser context with page management.
 
 import os
 import asyncio
+import base64
 import json
+import threading
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 from datetime import datetime
@@ -18,6 +20,65 @@ except ImportError:
     PLAYWRIGHT_AVAILABLE = False
 
 
+# Page-side extraction scripts. Kept as constant source strings with the
+# limit passed as an argument, so the browser sees the same script text on
+# every call and can reuse its compiled form.
+# null while the document has no body yet; the locator path then auto-waits
+_BODY_TEXT_JS = '() => document.body ? document.body.innerText : null'
+_BODY_HTML_JS = '() => document.body ? document.body.innerHTML : null'
+
+_LINKS_JS = '''(elements, limit) => elements.slice(0, limit).map(el => ({
+    text: el.innerText.trim().slice(0, 100),
+    href: el.href
+}))'''
+
+_IMAGES_JS = '''(elements, limit) => elements.slice(0, limit).map(el => ({
+    src: el.src,
+    alt: el.alt || ''
+}))'''
+
+_TABLE_JS = '''(table, limit) => {
+    const rows = Array.from(table.querySelectorAll('tr'));
+    return rows.slice(0, limit).map(row => {
+        return Array.from(row.querySelectorAll('th, td')).map(cell => cell.innerText.trim());
+    });
+}'''
+
+_SUMMARY_JS = '''({selector, limit, maxText}) => {
+    const root = selector ? document.querySelector(selector) : document.body;
+    if (!root) return null;
+    const pick = (sel) => Array.from(root.querySelectorAll(sel)).slice(0, limit);
+    return {
+        title: document.title,
+        text: root.innerText.slice(0, maxText),
+        links: pick('a[href]').map(el => ({
+            text: el.innerText.trim().slice(0, 100),
+            href: el.href
+        })),
+        images: pick('img[src]').map(el => ({
+            src: el.src,
+            alt: el.alt || ''
+        }))
+    };
+}'''
+
+_ATTRIBUTES_JS = '''(el, attrs) => {
+    const result = {};
+    attrs.forEach(attr => {
+        result[attr] = el.getAttribute(attr);
+    });
+    return result;
+}'''
+
+_ATTRIBUTES_ALL_JS = '''(elements, {attrs, limit}) => elements.slice(0, limit).map(el => {
+    const result = {};
+    attrs.forEach(attr => {
+        result[attr] = el.getAttribute(attr);
+    });
+    return result;
+})'''
+
+
 class BrowserController:
     """Controls a Playwright browser instance with persistent context."""
     
@@ -69,10 +130,20 @@ class BrowserController:
         self,
         url: Optional[str] = None,
         action: str = 'goto',
-        wait_until: str = 'domcontentloaded',
-        timeout: int = 30000
+        wait_until: str = 'commit',
+        timeout: int = 30000,
+        include_title: bool = False
     ) -> Dict[str, Any]:
-        """Navigate to URL or perform navigation action."""
+        """Navigate to URL or perform navigation action.
+
+        Defaults to returning at 'commit' (response received): follow-up
+        click/fill/extract calls auto-wait for their elements, so waiting for
+        a later lifecycle event here only adds latency. Pass 'load',
+        'domcontentloaded' or 'networkidle' for stricter guarantees.
+
+        The page title costs an extra round trip to the page, so it is only
+        included with include_title.
+        """
         if not self.page:
             await self.initialize()
         
@@ -91,27 +162,30 @@ class BrowserController:
                     timeout=timeout
                 )
                 
-                return {
+                result = {
                     'success': True,
                     'url': self.page.url,
-                    'title': await self.page.title(),
                     'status': response.status if response else None
                 }
             
-            elif action == 'back':
-                await self.page.go_back(wait_until=wait_until, timeout=timeout)
-            elif action == 'forward':
-                await self.page.go_forward(wait_until=wait_until, timeout=timeout)
-            elif action == 'reload':
-                await self.page.reload(wait_until=wait_until, timeout=timeout)
             else:
-                return {'success': False, 'error': f'Unknown action: {action}'}
+                if action == 'back':
+                    await self.page.go_back(wait_until=wait_until, timeout=timeout)
+                elif action == 'forward':
+                    await self.page.go_forward(wait_until=wait_until, timeout=timeout)
+                elif action == 'reload':
+                    await self.page.reload(wait_until=wait_until, timeout=timeout)
+                else:
+                    return {'success': False, 'error': f'Unknown action: {action}'}
+                
+                result = {
+                    'success': True,
+                    'url': self.page.url
+                }
             
-            return {
-                'success': True,
-                'url': self.page.url,
-                'title': await self.page.title()
-            }
+            if include_title:
+                result['title'] = await self.page.title()
+            return result
             
         except Exception as e:
             return {'success': False, 'error': str(e)}
@@ -122,9 +196,14 @@ class BrowserController:
         text: Optional[str] = None,
         button: str = 'left',
         click_count: int = 1,
-        timeout: int = 10000
+        timeout: int = 10000,
+        wait_until: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Click on an element."""
+        """Click on an element.
+
+        Set wait_until ('load', 'domcontentloaded', 'networkidle') to wait for
+        a navigation triggered by the click.
+        """
         if not self.page:
             await self.initialize()
         
@@ -143,8 +222,8 @@ class BrowserController:
                 timeout=timeout
             )
             
-            # Wait for any navigation
-            await self.page.wait_for_load_state('domcontentloaded', timeout=5000)
+            if wait_until:
+                await self.page.wait_for_load_state(wait_until, timeout=timeout)
             
             return {
                 'success': True,
@@ -163,9 +242,15 @@ class BrowserController:
         placeholder: Optional[str] = None,
         clear: bool = True,
         press_enter: bool = False,
-        timeout: int = 10000
+        timeout: int = 10000,
+        wait_until: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Fill a form field."""
+        """Fill a form field.
+
+        fill() already replaces the current value; with clear=False the value
+        is typed after the existing text instead.
+        Set wait_until to wait for a navigation triggered by press_enter.
+        """
         if not self.page:
             await self.initialize()
         
@@ -182,13 +267,14 @@ class BrowserController:
             element = locator.first
             
             if clear:
-                await element.clear(timeout=timeout)
-            
-            await element.fill(value, timeout=timeout)
+                await element.fill(value, timeout=timeout)
+            else:
+                await element.press_sequentially(value, timeout=timeout)
             
             if press_enter:
                 await element.press('Enter')
-                await self.page.wait_for_load_state('domcontentloaded', timeout=5000)
+                if wait_until:
+                    await self.page.wait_for_load_state(wait_until, timeout=timeout)
             
             return {
                 'success': True,
@@ -216,7 +302,12 @@ class BrowserController:
                 elements = self.page.locator('body')
             
             if extract_type == 'text':
-                text = await elements.first.inner_text()
+                text = None
+                if not selector:
+                    # One evaluate instead of resolving a locator then reading
+                    text = await self.page.evaluate(_BODY_TEXT_JS)
+                if text is None:
+                    text = await elements.first.inner_text()
                 return {
                     'success': True,
                     'content': text[:10000],  # Limit text length
@@ -224,7 +315,11 @@ class BrowserController:
                 }
             
             elif extract_type == 'html':
-                html = await elements.first.inner_html()
+                html = None
+                if not selector:
+                    html = await self.page.evaluate(_BODY_HTML_JS)
+                if html is None:
+                    html = await elements.first.inner_html()
                 return {
                     'success': True,
                     'content': html[:20000],
@@ -232,13 +327,7 @@ class BrowserController:
                 }
             
             elif extract_type == 'links':
-                links = await self.page.eval_on_selector_all(
-                    selector or 'a[href]',
-                    '''elements => elements.slice(0, ''' + str(limit) + ''').map(el => ({
-                        text: el.innerText.trim().slice(0, 100),
-                        href: el.href
-                    }))'''
-                )
+                links = await self.page.eval_on_selector_all(selector or 'a[href]', _LINKS_JS, limit)
                 return {
                     'success': True,
                     'links': links,
@@ -247,13 +336,7 @@ class BrowserController:
                 }
             
             elif extract_type == 'images':
-                images = await self.page.eval_on_selector_all(
-                    selector or 'img[src]',
-                    '''elements => elements.slice(0, ''' + str(limit) + ''').map(el => ({
-                        src: el.src,
-                        alt: el.alt || ''
-                    }))'''
-                )
+                images = await self.page.eval_on_selector_all(selector or 'img[src]', _IMAGES_JS, limit)
                 return {
                     'success': True,
                     'images': images,
@@ -263,15 +346,7 @@ class BrowserController:
             
             elif extract_type == 'table':
                 # Extract table data
-                table_data = await self.page.eval_on_selector(
-                    selector or 'table',
-                    '''table => {
-                        const rows = Array.from(table.querySelectorAll('tr'));
-                        return rows.slice(0, ''' + str(limit) + ''').map(row => {
-                            return Array.from(row.querySelectorAll('th, td')).map(cell => cell.innerText.trim());
-                        });
-                    }'''
-                )
+                table_data = await self.page.eval_on_selector(selector or 'table', _TABLE_JS, limit)
                 return {
                     'success': True,
                     'table': table_data,
@@ -279,23 +354,45 @@ class BrowserController:
                     'url': self.page.url
                 }
             
+            elif extract_type == 'summary':
+                # Title, text, links and images in a single page round trip
+                summary = await self.page.evaluate(
+                    _SUMMARY_JS,
+                    {'selector': selector, 'limit': limit, 'maxText': 10000}
+                )
+                if summary is None:
+                    return {'success': False, 'error': f'No element matches selector: {selector}'}
+                return {
+                    'success': True,
+                    **summary,
+                    'url': self.page.url
+                }
+            
             elif extract_type == 'attributes':
                 if not attributes:
                     attributes = ['id', 'class', 'name', 'value']
                 
-                attrs = await elements.first.evaluate(
-                    '''(el, attrs) => {
-                        const result = {};
-                        attrs.forEach(attr => {
-                            result[attr] = el.getAttribute(attr);
-                        });
-                        return result;
-                    }''',
-                    attributes
-                )
+                if limit <= 1:
+                    attrs = await elements.first.evaluate(_ATTRIBUTES_JS, attributes)
+                    return {
+                        'success': True,
+                        'attributes': attrs,
+                        'url': self.page.url
+                    }
+                
+                # All matching elements in one round trip. evaluate_all does
+                # not auto-wait, so wait for a first match only if none is
+                # attached yet.
+                arg = {'attrs': attributes, 'limit': limit}
+                items = await elements.evaluate_all(_ATTRIBUTES_ALL_JS, arg)
+                if not items:
+                    await elements.first.wait_for(state='attached')
+                    items = await elements.evaluate_all(_ATTRIBUTES_ALL_JS, arg)
                 return {
                     'success': True,
-                    'attributes': attrs,
+                    'attributes': items[0] if items else {},
+                    'items': items,
+                    'count': len(items),
                     'url': self.page.url
                 }
             
@@ -310,37 +407,54 @@ class BrowserController:
         selector: Optional[str] = None,
         path: Optional[str] = None,
         full_page: bool = False,
-        format: str = 'png',
-        quality: int = 80
+        format: str = 'jpeg',
+        quality: int = 60,
+        return_bytes: bool = False
     ) -> Dict[str, Any]:
-        """Take a screenshot."""
+        """Take a screenshot.
+        
+        With return_bytes the image is not written to disk; it is returned
+        base64-encoded in 'data' for callers that consume it in memory.
+        """
         if not self.page:
             await self.initialize()
         
         try:
-            # Generate path if not provided
-            if not path:
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                path = str(self._screenshots_dir / f'screenshot_{timestamp}.{format}')
-            
-            # Ensure directory exists
-            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            if return_bytes:
+                path = None
+            else:
+                # Generate path if not provided
+                if not path:
+                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                    path = str(self._screenshots_dir / f'screenshot_{timestamp}.{format}')
+                
+                # Ensure directory exists
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
             
             if selector:
                 element = self.page.locator(selector).first
-                await element.screenshot(
+                image = await element.screenshot(
                     path=path,
                     type=format,
                     quality=quality if format == 'jpeg' else None
                 )
             else:
-                await self.page.screenshot(
+                image = await self.page.screenshot(
                     path=path,
                     full_page=full_page,
                     type=format,
                     quality=quality if format == 'jpeg' else None
                 )
             
+            if return_bytes:
+                return {
+                    'success': True,
+                    'format': format,
+                    'size': len(image),
+                    'data': base64.b64encode(image).decode('ascii'),
+                    'url': self.page.url,
+                }
+            
             return {
                 'success': True,
                 'path': path,
@@ -374,8 +488,9 @@ async def execute_action(tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
         return await controller.navigate(
             url=args.get('url'),
             action=args.get('action', 'goto'),
-            wait_until=args.get('wait_until', 'domcontentloaded'),
-            timeout=args.get('timeout', 30000)
+            wait_until=args.get('wait_until', 'commit'),
+            timeout=args.get('timeout', 30000),
+            include_title=args.get('include_title', False)
         )
     
     elif tool == 'browser_click':
@@ -384,7 +499,8 @@ async def execute_action(tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
             text=args.get('text'),
             button=args.get('button', 'left'),
             click_count=args.get('click_count', 1),
-            timeout=args.get('timeout', 10000)
+            timeout=args.get('timeout', 10000),
+            wait_until=args.get('wait_until')
         )
     
     elif tool == 'browser_fill':
@@ -394,7 +510,9 @@ async def execute_action(tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
             label=args.get('label'),
             placeholder=args.get('placeholder'),
             clear=args.get('clear', True),
-            press_enter=args.get('press_enter', False)
+            press_enter=args.get('press_enter', False),
+            timeout=args.get('timeout', 10000),
+            wait_until=args.get('wait_until')
         )
     
     elif tool == 'browser_extract':
@@ -406,27 +524,74 @@ async def execute_action(tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
         )
     
     elif tool == 'browser_screenshot':
+        path = args.get('path')
+        # JPEG by default; an explicit .png path without a format stays PNG
+        default_format = 'png' if path and path.lower().endswith('.png') else 'jpeg'
         return await controller.screenshot(
             selector=args.get('selector'),
-            path=args.get('path'),
+            path=path,
             full_page=args.get('full_page', False),
-            format=args.get('format', 'png'),
-            quality=args.get('quality', 80)
+            format=args.get('format', default_format),
+            quality=args.get('quality', 60),
+            return_bytes=args.get('return_bytes', False)
+        )
+    
+    elif tool == 'browser_batch':
+        return await execute_batch(
+            args.get('actions', []),
+            stop_on_error=args.get('stop_on_error', False)
         )
     
     else:
         return {'success': False, 'error': f'Unknown tool: {tool}'}
 
 
-def run_async(coro):
-    """Run async coroutine in sync context."""
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+async def execute_batch(actions: List[Dict[str, Any]], stop_on_error: bool = False) -> Dict[str, Any]:
+    """Execute a sequence of actions ({tool, args}) in order on the shared page."""
+    results = []
+    for action in actions:
+        if not isinstance(action, dict) or not action.get('tool'):
+            result = {'success': False, 'error': 'Each action needs a tool name'}
+        else:
+            result = await execute_action(action['tool'], dict(action.get('args') or {}))
+        results.append(result)
+        if stop_on_error and not result.get('success'):
+            break
     
-    return loop.run_until_complete(coro)
+    return {
+        'success': all(r.get('success') for r in results),
+        'results': results,
+    }
+
+
+async def close_controller() -> None:
+    """Close the browser controller singleton, if any."""
+    global _controller
+    if _controller is not None:
+        controller, _controller = _controller, None
+        await controller.close()
+
+
+# Long-lived event loop running on a daemon thread. Playwright objects are
+# bound to the loop that created them, so every call must go through the same
+# loop for the _controller singleton (and its browser) to stay usable.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='browser-loop', daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+def run_async(coro):
+    """Run async coroutine on the shared browser loop and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
 
 
 if __name__ == '__main__':
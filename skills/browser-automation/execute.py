@@ -2,16 +2,73 @@
 """
 Browser Automation Skill - Main entry point.
 Dispatches browser action requests to the Playwright controller.
+
+Usage:
+  execute.py            one JSON request on stdin, one JSON result on stdout
+  execute.py --serve    one JSON request per stdin line, one JSON result line
+                        per request; the browser stays open between requests
+
+A request is either {"tool": ..., "args": {...}} or a batch
+{"actions": [{"tool": ..., "args": {...}}, ...], "stop_on_error": false}.
 """
 
 import sys
 import json
 import os
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Add parent directories to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from browser.controller import execute_action, run_async, PLAYWRIGHT_AVAILABLE
+from browser.controller import execute_action, execute_batch, close_controller, run_async, PLAYWRIGHT_AVAILABLE
+
+
+def write_json(data):
+    """Write one JSON line to stdout as UTF-8 bytes, using orjson when available."""
+    payload = None
+    if orjson is not None:
+        try:
+            payload = orjson.dumps(data)
+        except TypeError:
+            pass  # types orjson rejects (e.g. ints over 64 bits) go to json
+    if payload is None:
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    out = sys.stdout.buffer
+    out.write(payload)
+    out.write(b'\n')
+    out.flush()
+
+
+def dispatch(input_data):
+    """Run a single action or a batch of actions in one event-loop round trip."""
+    actions = input_data.get('actions')
+    if isinstance(actions, list):
+        return run_async(execute_batch(actions, stop_on_error=bool(input_data.get('stop_on_error', False))))
+    
+    tool_name = input_data.get('tool')
+    if not tool_name:
+        raise ValueError('Tool name is required')
+    return run_async(execute_action(tool_name, input_data.get('args', {})))
+
+
+def serve():
+    """Answer newline-delimited JSON requests until stdin closes, reusing one browser."""
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            result = dispatch(json.loads(line))
+        except json.JSONDecodeError as e:
+            result = {'success': False, 'error': f'Invalid JSON input: {str(e)}'}
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        write_json(result)
+    
+    run_async(close_controller())
 
 
 def main():
@@ -19,42 +76,36 @@ def main():
     try:
         # Check if Playwright is available
         if not PLAYWRIGHT_AVAILABLE:
-            print(json.dumps({
+            write_json({
                 'success': False,
                 'error': 'Playwright is not installed. Install with: pip install playwright && playwright install chromium'
-            }))
+            })
             sys.exit(1)
         
+        if '--serve' in sys.argv[1:]:
+            serve()
+            return
+        
         # Read input from stdin
         input_data = json.loads(sys.stdin.read())
         
-        tool_name = input_data.get('tool')
-        args = input_data.get('args', {})
-        
-        if not tool_name:
-            print(json.dumps({
-                'success': False,
-                'error': 'Tool name is required'
-            }))
-            sys.exit(1)
-        
-        # Execute the action
-        result = run_async(execute_action(tool_name, args))
+        # Execute the action (or batch of actions)
+        result = dispatch(input_data)
         
         # Output result
-        print(json.dumps(result, ensure_ascii=False))
+        write_json(result)
         
     except json.JSONDecodeError as e:
-        print(json.dumps({
+        write_json({
             'success': False,
             'error': f'Invalid JSON input: {str(e)}'
-        }))
+        })
         sys.exit(1)
     except Exception as e:
-        print(json.dumps({
+        write_json({
             'success': False,
             'error': str(e)
-        }))
+        })
         sys.exit(1)
 
 
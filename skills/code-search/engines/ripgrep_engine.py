@@ -6,9 +6,35 @@ Uses ripgrep (rg) for fast, recursive text searching.
 
 import subprocess
 import json
+import functools
 import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Callable
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+
+@functools.lru_cache(maxsize=1)
+def _ripgrep_available() -> bool:
+    """Check once per process whether ripgrep is installed."""
+    try:
+        result = subprocess.run(
+            ['rg', '--version'],
+            capture_output=True,
+            text=True,
+            timeout=5
+        )
+        return result.returncode == 0
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return False
 
 
 class RipgrepEngine:
@@ -31,22 +57,28 @@ class RipgrepEngine:
         'markdown': ['md'],
     }
     
+    # Prebuilt rg `-g` arguments per language
+    _LANG_ARGS = {
+        lang: tuple(arg for ext in exts for arg in ('-g', f'*.{ext}'))
+        for lang, exts in LANGUAGE_MAP.items()
+    }
+    
+    SEARCH_TIMEOUT = 30  # seconds
+    FALLBACK_WORKERS = os.cpu_count() or 4
+    TWO_PHASE_LIMIT = 20  # run a files-with-matches pass first up to this limit
+    
     def __init__(self, project_root: str):
         self.project_root = Path(project_root)
-        self.rg_available = self._check_ripgrep()
+        # Paths under the root start with this prefix; stripping it is much
+        # cheaper than Path.relative_to for every result
+        self._root_prefix = str(self.project_root).rstrip(os.sep) + os.sep
+        self.rg_available = _ripgrep_available()
     
-    def _check_ripgrep(self) -> bool:
-        """Check if ripgrep is installed."""
-        try:
-            result = subprocess.run(
-                ['rg', '--version'],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            return result.returncode == 0
-        except (FileNotFoundError, subprocess.TimeoutExpired):
-            return False
+    def _relative(self, path: str) -> str:
+        """Return path relative to the project root, or unchanged if outside it."""
+        if path.startswith(self._root_prefix):
+            return path[len(self._root_prefix):]
+        return path
     
     def search(
         self,
@@ -54,7 +86,8 @@ class RipgrepEngine:
         scope: Optional[str] = None,
         language: Optional[str] = None,
         limit: int = 10,
-        context_lines: int = 2
+        context_lines: int = 2,
+        accept: Optional[Callable[[Dict[str, Any]], bool]] = None
     ) -> List[Dict[str, Any]]:
         """
         Search for text patterns using ripgrep.
@@ -65,12 +98,22 @@ class RipgrepEngine:
             language: Filter by programming language
             limit: Maximum number of results
             context_lines: Number of context lines before/after match
+            accept: Called on each match in output order; matches it rejects
+                are dropped and do not count towards limit
             
         Returns:
             List of search results with file, line, match, and context
         """
         if not self.rg_available:
-            return self._fallback_search(query, scope, language, limit)
+            return self._fallback_search(query, scope, language, limit, accept)
+        
+        # Language filter globs
+        globs = self._LANG_ARGS.get(language.lower(), ()) if language else ()
+        
+        # Search path
+        search_path = self.project_root
+        if scope:
+            search_path = self.project_root / scope
         
         # Build ripgrep command
         cmd = ['rg', '--json', '-i']  # JSON output, case insensitive
@@ -79,60 +122,123 @@ class RipgrepEngine:
         if context_lines > 0:
             cmd.extend(['-C', str(context_lines)])
         
-        # Add language filter
-        if language and language.lower() in self.LANGUAGE_MAP:
-            for ext in self.LANGUAGE_MAP[language.lower()]:
-                cmd.extend(['-g', f'*.{ext}'])
-        
-        # Add max results
-        cmd.extend(['-m', str(limit * 3)])  # Get more than needed for ranking
+        cmd.extend(globs)
         
         # Add query
         cmd.append(query)
         
-        # Add search path
-        search_path = self.project_root
-        if scope:
-            search_path = self.project_root / scope
-        cmd.append(str(search_path))
-        
         try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=30,
-                cwd=str(self.project_root)
-            )
-            
-            return self._parse_rg_output(result.stdout, limit)
+            paths = [str(search_path)]
+            if limit <= self.TWO_PHASE_LIMIT and accept is None:
+                # Cheap first pass: find candidate files without emitting JSON
+                # and context for every match, then run the full search only
+                # on those. Each file holds at least one match, so limit * 2
+                # files always yield `limit` results when that many exist.
+                list_cmd = ['rg', '-l', '-i', '--max-count', '1', *globs, query, str(search_path)]
+                paths = self._run_rg(list_cmd, lambda out: [
+                    line.rstrip('\n') for line in islice(out, limit * 2)
+                ])
+                if not paths:
+                    return []
             
+            return self._run_rg(cmd + paths, lambda out: self._parse_rg_output(out, limit, accept))
         except subprocess.TimeoutExpired:
             return [{'error': 'Search timed out', 'query': query}]
         except Exception as e:
             return [{'error': str(e), 'query': query}]
     
-    def _parse_rg_output(self, output: str, limit: int) -> List[Dict[str, Any]]:
-        """Parse ripgrep JSON output into structured results."""
+    def _run_rg(self, cmd: List[str], consume: Callable[[Iterable[str]], Any]) -> Any:
+        """Run rg and pass its stdout lines to `consume`.
+        
+        Output is streamed rather than buffered, and rg is stopped as soon as
+        `consume` returns. Raises subprocess.TimeoutExpired if rg runs longer
+        than SEARCH_TIMEOUT, and RuntimeError if rg fails without producing
+        any result (e.g. an invalid regex or a missing path).
+        """
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            cwd=str(self.project_root)
+        )
+        
+        timed_out = threading.Event()
+        
+        def on_timeout():
+            timed_out.set()
+            proc.kill()
+        
+        timer = threading.Timer(self.SEARCH_TIMEOUT, on_timeout)
+        timer.start()
+        try:
+            result = consume(proc.stdout)
+        except Exception:
+            if not timed_out.is_set():
+                raise
+            result = None
+        finally:
+            timer.cancel()
+            if proc.poll() is None:
+                proc.terminate()
+            proc.stdout.close()
+            try:
+                proc.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(cmd, self.SEARCH_TIMEOUT)
+        # Exit code 2 is also used for partial errors such as an unreadable
+        # file, so it is only fatal when nothing was found
+        if proc.returncode == 2 and not result:
+            raise RuntimeError('ripgrep failed (invalid pattern or path?)')
+        return result
+    
+    def _parse_rg_output(
+        self,
+        output_lines: Iterable[str],
+        limit: int,
+        accept: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> List[Dict[str, Any]]:
+        """Parse ripgrep JSON output lines into structured results.
+        
+        Consumes `output_lines` lazily and returns as soon as `limit` matches are
+        complete; a match is complete at the next match or at the end of its
+        file, so context from the following file is never attached to it.
+        
+        Only the last 3 context lines before and the first 3 after a match are
+        kept, as raw (line, text) pairs; they are formatted when the match is
+        finalized.
+        """
         results = []
+        root_prefix = self._root_prefix
         current_match = None
-        context_before = []
+        context_before = deque(maxlen=3)
         context_after = []
         
-        for line in output.strip().split('\n'):
-            if not line:
+        def finalize(match):
+            if accept is not None and not accept(match):
+                return
+            match['context_before'] = [f"{n}: {t.strip()}" for n, t in context_before]
+            match['context_after'] = [f"{n}: {t.strip()}" for n, t in context_after]
+            results.append(match)
+        
+        for line in output_lines:
+            if not line.strip():
                 continue
             
             try:
-                data = json.loads(line)
+                data = json_loads(line)
                 msg_type = data.get('type')
                 
                 if msg_type == 'match':
                     # Save previous match if exists
                     if current_match:
-                        current_match['context_before'] = context_before[-3:]
-                        current_match['context_after'] = context_after[:3]
-                        results.append(current_match)
+                        finalize(current_match)
                         if len(results) >= limit:
                             break
                     
@@ -143,10 +249,7 @@ class RipgrepEngine:
                     line_num = match_data.get('line_number', 0)
                     
                     # Make path relative
-                    try:
-                        rel_path = str(Path(path).relative_to(self.project_root))
-                    except ValueError:
-                        rel_path = path
+                    rel_path = path[len(root_prefix):] if path.startswith(root_prefix) else path
                     
                     current_match = {
                         'file': rel_path,
@@ -155,29 +258,33 @@ class RipgrepEngine:
                         'context_before': [],
                         'context_after': [],
                     }
-                    context_before = []
+                    context_before.clear()
                     context_after = []
+                
+                elif msg_type == 'end':
+                    # End of a file: its last match can no longer get context
+                    if current_match:
+                        finalize(current_match)
+                        current_match = None
+                        if len(results) >= limit:
+                            break
                     
                 elif msg_type == 'context':
                     # Context line
-                    ctx_data = data.get('data', {})
-                    ctx_text = ctx_data.get('lines', {}).get('text', '').strip()
-                    ctx_line = ctx_data.get('line_number', 0)
-                    
                     if current_match:
+                        ctx_data = data.get('data', {})
+                        ctx_line = ctx_data.get('line_number', 0)
                         if ctx_line < current_match['line']:
-                            context_before.append(f"{ctx_line}: {ctx_text}")
-                        else:
-                            context_after.append(f"{ctx_line}: {ctx_text}")
+                            context_before.append((ctx_line, ctx_data.get('lines', {}).get('text', '')))
+                        elif len(context_after) < 3:
+                            context_after.append((ctx_line, ctx_data.get('lines', {}).get('text', '')))
                     
-            except json.JSONDecodeError:
+            except ValueError:  # json / orjson JSONDecodeError
                 continue
         
         # Don't forget the last match
         if current_match and len(results) < limit:
-            current_match['context_before'] = context_before[-3:]
-            current_match['context_after'] = context_after[:3]
-            results.append(current_match)
+            finalize(current_match)
         
         return results
     
@@ -186,12 +293,12 @@ class RipgrepEngine:
         query: str,
         scope: Optional[str],
         language: Optional[str],
-        limit: int
+        limit: int,
+        accept: Optional[Callable[[Dict[str, Any]], bool]] = None
     ) -> List[Dict[str, Any]]:
         """Fallback search using Python when ripgrep is not available."""
         import re
         
-        results = []
         search_path = self.project_root
         if scope:
             search_path = self.project_root / scope
@@ -203,57 +310,132 @@ class RipgrepEngine:
         
         # Compile regex
         try:
-            pattern = re.compile(query, re.IGNORECASE)
+            pattern = re.compile(query, re.IGNORECASE | re.MULTILINE)
         except re.error:
             # Treat as literal string
-            pattern = re.compile(re.escape(query), re.IGNORECASE)
+            pattern = re.compile(re.escape(query), re.IGNORECASE | re.MULTILINE)
+        
+        # Scan files on a thread pool; file reads and the regex engine release
+        # the GIL. Results are consumed in walk order so output matches a
+        # sequential scan, and a bounded window keeps the walk lazy.
+        # Rejected matches don't count, so with accept a file is scanned fully
+        per_file = limit if accept is None else sys.maxsize
+        results = []
+        pending = deque()
+        window = self.FALLBACK_WORKERS * 4
+        with ThreadPoolExecutor(max_workers=self.FALLBACK_WORKERS) as executor:
+            for filepath in self._iter_files(search_path, extensions):
+                pending.append(executor.submit(self._scan_file, filepath, pattern, per_file))
+                if len(pending) >= window:
+                    results.extend(filter(accept, pending.popleft().result()))
+                    if len(results) >= limit:
+                        break
+            
+            while pending and len(results) < limit:
+                results.extend(filter(accept, pending.popleft().result()))
+            
+            for future in pending:
+                future.cancel()
         
-        # Walk directory
+        return results[:limit]
+    
+    def _iter_files(self, search_path: Path, extensions: Optional[List[str]]) -> Iterable[Path]:
+        """Yield searchable files under search_path in os.walk order."""
         for root, dirs, files in os.walk(search_path):
             # Skip hidden and common ignore directories
             dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['node_modules', '__pycache__', 'venv', 'dist', 'build']]
             
             for filename in files:
-                if len(results) >= limit:
-                    break
-                
                 # Check extension filter
                 if extensions:
                     ext = filename.rsplit('.', 1)[-1] if '.' in filename else ''
                     if ext not in extensions:
                         continue
                 
-                filepath = Path(root) / filename
-                try:
-                    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                        lines = f.readlines()
-                    
-                    for i, line in enumerate(lines, 1):
-                        if pattern.search(line):
-                            try:
-                                rel_path = str(filepath.relative_to(self.project_root))
-                            except ValueError:
-                                rel_path = str(filepath)
-                            
-                            results.append({
-                                'file': rel_path,
-                                'line': i,
-                                'match': line.strip(),
-                                'context_before': [f"{j}: {lines[j-1].strip()}" for j in range(max(1, i-2), i) if j <= len(lines)],
-                                'context_after': [f"{j}: {lines[j-1].strip()}" for j in range(i+1, min(len(lines)+1, i+3))],
-                            })
-                            
-                            if len(results) >= limit:
-                                break
-                                
-                except (IOError, UnicodeDecodeError):
-                    continue
+                yield Path(root) / filename
+    
+    def _scan_file(self, filepath: Path, pattern, max_results: int) -> List[Dict[str, Any]]:
+        """Find up to max_results matching lines in one file.
+        
+        The pattern runs over the whole decoded file instead of once per line
+        from readlines(); line numbers and the two context lines on each side
+        are computed from offsets only for lines that actually match.
+        """
+        try:
+            with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+                text = f.read()
+        except (IOError, UnicodeDecodeError):
+            return []
+        
+        if '\x00' in text[:4096]:
+            return []  # binary file (ripgrep skips these too)
+        
+        rel_path = self._relative(str(filepath))
+        
+        results = []
+        size = len(text)
+        pos = 0
+        line_no = 1
+        counted_to = 0
+        
+        while pos <= size and len(results) < max_results:
+            m = pattern.search(text, pos)
+            if not m:
+                break
             
-            if len(results) >= limit:
+            line_start = text.rfind('\n', 0, m.start()) + 1
+            if line_start >= size:
+                break  # empty match after the final newline
+            line_end = text.find('\n', line_start)
+            line_end = size if line_end == -1 else line_end + 1
+            line = text[line_start:line_end]
+            
+            # A candidate may span or look across lines; keep per-line semantics
+            if not pattern.search(line):
+                pos = line_end
+                continue
+            
+            line_no += text.count('\n', counted_to, line_start)
+            counted_to = line_start
+            
+            results.append({
+                'file': rel_path,
+                'line': line_no,
+                'match': line.strip(),
+                'context_before': self._lines_before(text, line_start, line_no, 2),
+                'context_after': self._lines_after(text, line_end, line_no, 2),
+            })
+            
+            if line_end >= size:
                 break
+            pos = line_end
         
         return results
     
+    @staticmethod
+    def _lines_before(text: str, line_start: int, line_no: int, count: int) -> List[str]:
+        lines = []
+        end = line_start
+        for n in range(line_no - 1, max(0, line_no - 1 - count), -1):
+            start = text.rfind('\n', 0, end - 1) + 1
+            lines.append(f"{n}: {text[start:end].strip()}")
+            end = start
+        lines.reverse()
+        return lines
+    
+    @staticmethod
+    def _lines_after(text: str, line_end: int, line_no: int, count: int) -> List[str]:
+        lines = []
+        start = line_end
+        for n in range(line_no + 1, line_no + 1 + count):
+            if start >= len(text):
+                break
+            end = text.find('\n', start)
+            end = len(text) if end == -1 else end + 1
+            lines.append(f"{n}: {text[start:end].strip()}")
+            start = end
+        return lines
+    
     def search_files(
         self,
         pattern: str,
@@ -273,18 +455,77 @@ class RipgrepEngine:
         if path:
             search_path = self.project_root / path
         
+        if self.rg_available:
+            return self._rg_files(pattern, search_path)
+        
         results = []
         
         # Use glob for pattern matching
         for match in search_path.glob(pattern):
             if match.is_file():
-                try:
-                    rel_path = str(match.relative_to(self.project_root))
-                except ValueError:
-                    rel_path = str(match)
-                results.append(rel_path)
+                results.append(self._relative(str(match)))
         
         return sorted(results)
+    
+    def files_containing(
+        self,
+        literal: str,
+        scope: Optional[str] = None,
+        ignore_case: bool = False
+    ) -> Optional[set]:
+        """Files under scope whose text contains literal, as normalized absolute paths.
+        
+        Unlike search, ignore files and hidden files are not honoured, so the
+        result can be used to narrow another walk of the same tree. Returns
+        None if ripgrep is unavailable or fails.
+        """
+        if not self.rg_available:
+            return None
+        
+        search_path = self.project_root
+        if scope:
+            search_path = self.project_root / scope
+        
+        cmd = [
+            'rg', '--files-with-matches', '--no-ignore', '--hidden', '--text',
+            '--fixed-strings', '--no-messages', '-i' if ignore_case else '-s',
+            '-e', literal, '--', os.path.abspath(search_path),
+        ]
+        try:
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                encoding='utf-8',
+                errors='surrogateescape',
+                timeout=self.SEARCH_TIMEOUT
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if result.returncode not in (0, 1):  # 1: no matches
+            return None
+        return {os.path.normpath(line) for line in result.stdout.splitlines() if line}
+    
+    def _rg_files(self, pattern: str, search_path: Path) -> List[str]:
+        """List files matching a glob with `rg --files`.
+        
+        rg walks in parallel and skips ignored and hidden files. It runs from
+        search_path so the glob is matched relative to it as with Path.glob; a
+        glob without a slash would match at any depth, so it is anchored.
+        """
+        glob = pattern if '/' in pattern else '/' + pattern
+        result = subprocess.run(
+            ['rg', '--files', '-g', glob],
+            capture_output=True,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            timeout=self.SEARCH_TIMEOUT,
+            cwd=str(search_path)
+        )
+        
+        prefix = self._relative(str(search_path) + os.sep)
+        return sorted(prefix + line for line in result.stdout.splitlines() if line)
 
 
 if __name__ == '__main__':
@@ -8,6 +8,12 @@ import os
 import json
 import hashlib
 import sqlite3
+import struct
+import threading
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Tuple
 import re
@@ -15,10 +21,53 @@ import re
 # Try to import requests for API calls
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
     REQUESTS_AVAILABLE = True
 except ImportError:
     REQUESTS_AVAILABLE = False
 
+# numpy is optional; similarity falls back to pure Python without it
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Fast non-cryptographic hashes for file fingerprints (optional); the hash
+# is only a content-equality key. Falls back to MD5.
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+if xxhash is not None:
+    HASH_ALGORITHM = 'xxh3'
+elif blake3 is not None:
+    HASH_ALGORITHM = 'blake3'
+else:
+    HASH_ALGORITHM = 'md5'
+
+# hnswlib (optional) provides an approximate nearest-neighbour index so
+# search does not have to score every stored chunk
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+# cupy (optional) scores large embedding matrices on a CUDA GPU
+try:
+    import cupy
+    CUPY_AVAILABLE = cupy.cuda.runtime.getDeviceCount() > 0
+except Exception:  # not installed, or no usable CUDA device/driver
+    CUPY_AVAILABLE = False
+
 
 class SemanticEngine:
     """
@@ -43,12 +92,97 @@ class SemanticEngine:
     # Chunk size for embedding (approximate tokens)
     CHUNK_SIZE = 500  # characters, roughly 100-150 tokens
     
+    # Lines where a chunk may start: a definition keyword after optional
+    # indentation (same as testing line.strip() but without the copy)
+    _SPLIT_RE = re.compile(r'\s*(?:def |class |function |async function |export )\s*\S')
+    
+    # Bytes read per step when hashing a file
+    HASH_BLOCK_SIZE = 1 << 20
+    
+    # Inputs per /v1/embeddings request
+    EMBED_BATCH_SIZE = 64
+    # Files embedded concurrently by index_directory (bounds in-flight requests)
+    EMBED_WORKERS = 5
+    # Consecutive files whose chunks index_directory embeds together
+    EMBED_GROUP_FILES = 16
+    # Files written per transaction by index_directory
+    INDEX_BATCH_FILES = 100
+    # Retries per embedding request on HTTP 429/502/503
+    EMBED_RETRIES = 3
+    # Query embeddings kept in the query_cache table
+    QUERY_CACHE_SIZE = 256
+    # search_codebase results reused for near-duplicate queries (cosine
+    # similarity of the query embeddings) within RESULT_CACHE_TTL seconds
+    RESULT_CACHE_SIMILARITY = 0.95
+    RESULT_CACHE_TTL = 300
+    RESULT_CACHE_SIZE = 256
+    # Chunk embeddings kept in the embedding_cache table, by chunk content
+    EMBED_CACHE_SIZE = 200000
+    # ANN neighbours fetched per requested search result
+    ANN_CANDIDATES = 3
+    # Embedding matrices with at least this many rows are scored on the GPU
+    GPU_MIN_ROWS = 50000
+    # Larger CPU matrices are pre-scored on an int8 copy, then the best
+    # QUANTIZED_RERANK candidates per requested result are rescored in float32
+    QUANTIZED_MIN_ROWS = 100000
+    QUANTIZED_RERANK = 4
+    
+    # Applied to every connection: WAL makes NORMAL sync safe, larger page
+    # cache (64 MB), in-memory temp tables and 256 MB of memory-mapped I/O
+    CONNECTION_PRAGMAS = (
+        'PRAGMA synchronous=NORMAL',
+        'PRAGMA cache_size=-65536',
+        'PRAGMA temp_store=MEMORY',
+        'PRAGMA mmap_size=268435456',
+    )
+    
     def __init__(self, project_root: str):
         self.project_root = Path(project_root)
         self.db_path = self.project_root / '.duncrew' / 'semantic_index.db'
         self.config = self._load_config()
+        self._session = self._create_session() if REQUESTS_AVAILABLE else None
+        # ANN index changes from _store_file, applied by _flush_ann
+        self._ann_removed: List[int] = []
+        self._ann_added: List[Tuple[int, Any]] = []
+        # (dim, chunk ids, memory-mapped embedding matrix) from _load_matrix
+        self._matrix = None
+        # GPU copy of that matrix, uploaded once per matrix
+        self._gpu_matrix = None
+        # int8 copy of that matrix and its per-row scales
+        self._quantized = None
         self._ensure_db()
     
+    def _create_session(self):
+        """HTTP session reusing connections across embedding requests.
+        
+        Rate-limited and unavailable responses are retried with backoff,
+        honoring Retry-After; embedding requests are safe to repeat.
+        """
+        retry_args = dict(
+            total=self.EMBED_RETRIES,
+            backoff_factor=0.5,
+            status_forcelist=[429, 502, 503],
+            allowed_methods=frozenset(['POST']),
+            raise_on_status=False,
+        )
+        try:
+            # Jitter keeps concurrent workers from retrying in lockstep (urllib3 2)
+            retry = Retry(backoff_jitter=1.0, **retry_args)
+        except TypeError:
+            retry = Retry(**retry_args)
+        
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+    
+    def close(self):
+        """Close pooled HTTP connections."""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+    
     def _load_config(self) -> Dict[str, str]:
         """Load LLM config from localStorage equivalent (config file)."""
         config_path = self.project_root / '.duncrew' / 'llm_config.json'
@@ -67,11 +201,22 @@ class SemanticEngine:
             'model': os.environ.get('DDOS_LLM_MODEL', ''),
         }
     
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection to the index with the per-connection PRAGMAs applied."""
+        conn = sqlite3.connect(str(self.db_path))
+        for pragma in self.CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
     def _ensure_db(self):
         """Ensure database and tables exist."""
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         
         conn = sqlite3.connect(str(self.db_path))
+        # page_size only takes effect on a new database, before WAL is enabled;
+        # journal_mode=WAL persists in the database file
+        conn.execute('PRAGMA page_size=32768')
+        conn.execute('PRAGMA journal_mode=WAL')
         cursor = conn.cursor()
         
         # Create tables
@@ -106,19 +251,68 @@ class SemanticEngine:
             ON chunks(file_hash)
         ''')
         
+        # Stat of each file when it was last indexed, to skip hashing
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS file_meta (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                file_hash TEXT NOT NULL
+            )
+        ''')
+        
+        # Query embeddings keyed by sha1 of (base_url, model, query)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS query_cache (
+                key TEXT PRIMARY KEY,
+                embedding BLOB NOT NULL,
+                created REAL NOT NULL
+            )
+        ''')
+        
+        # Chunk embeddings (float16) keyed by sha256 of (base_url, model,
+        # content), so unchanged chunks of an edited file are not re-embedded
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                key TEXT PRIMARY KEY,
+                embedding BLOB NOT NULL,
+                created REAL NOT NULL
+            )
+        ''')
+        
+        # Search results by query embedding; key hashes the other arguments
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS result_cache (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                results TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+        ''')
+        
         conn.commit()
         conn.close()
     
     def _get_embedding(self, text: str) -> Optional[List[float]]:
         """Get embedding from LLM API."""
-        if not REQUESTS_AVAILABLE:
-            return None
+        return self._get_embeddings([text])[0]
+    
+    def _get_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Get embeddings for several texts from LLM API.
+        
+        Texts are sent EMBED_BATCH_SIZE at a time, one request per batch.
+        Returns one entry per text, None where no embedding was obtained.
+        """
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        if self._session is None or not texts:
+            return embeddings
         
         api_key = self.config.get('api_key', '')
         base_url = self.config.get('base_url', '')
         
         if not api_key or not base_url:
-            return None
+            return embeddings
         
         # Build embedding URL
         url = base_url.rstrip('/')
@@ -127,49 +321,249 @@ class SemanticEngine:
                 url += '/v1'
             url += '/embeddings'
         
+        for offset in range(0, len(texts), self.EMBED_BATCH_SIZE):
+            batch = texts[offset:offset + self.EMBED_BATCH_SIZE]
+            try:
+                response = self._session.post(
+                    url,
+                    headers={
+                        'Authorization': f'Bearer {api_key}',
+                        'Content-Type': 'application/json',
+                    },
+                    json={
+                        'input': [text[:8000] for text in batch],  # Limit input size
+                        'model': self.config.get('model', 'text-embedding-3-small'),
+                    },
+                    timeout=30
+                )
+                
+                if response.status_code == 200:
+                    data = response.json()
+                    for position, item in enumerate(data.get('data') or []):
+                        # Items carry their input index; fall back to position
+                        index = item.get('index', position)
+                        if 0 <= index < len(batch):
+                            embeddings[offset + index] = item['embedding']
+                
+            except Exception as e:
+                pass
+        
+        return embeddings
+    
+    def _embedding_key(self, text: str) -> str:
+        """embedding_cache key of a chunk's content for the configured model."""
+        key_source = '\0'.join((
+            self.config.get('base_url', ''),
+            self.config.get('model', 'text-embedding-3-small'),
+            text,
+        ))
+        return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+    
+    def _get_cached_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Like _get_embeddings, but reuses embeddings of already seen texts.
+        
+        Only reads the database; _store_file records new embeddings.
+        """
+        keys = [self._embedding_key(text) for text in texts]
+        cached = {}
+        conn = self._connect()
         try:
-            response = requests.post(
-                url,
-                headers={
-                    'Authorization': f'Bearer {api_key}',
-                    'Content-Type': 'application/json',
-                },
-                json={
-                    'input': text[:8000],  # Limit input size
-                    'model': self.config.get('model', 'text-embedding-3-small'),
-                },
-                timeout=30
-            )
+            for offset in range(0, len(keys), 500):
+                batch = keys[offset:offset + 500]
+                cached.update(conn.execute(
+                    f'SELECT key, embedding FROM embedding_cache WHERE key IN ({",".join("?" * len(batch))})',
+                    batch
+                ))
+        finally:
+            conn.close()
+        
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        fetched = self._get_embeddings([texts[i] for i in missing])
+        embeddings = [self._unpack_half(cached[key]) if key in cached else None for key in keys]
+        for i, embedding in zip(missing, fetched):
+            embeddings[i] = embedding
+        return embeddings
+    
+    @staticmethod
+    def _pack_half(embedding) -> bytes:
+        """Serialize an embedding as little-endian float16 (half the bytes)."""
+        if NUMPY_AVAILABLE:
+            return np.asarray(embedding, dtype='<f2').tobytes()
+        return struct.pack(f'<{len(embedding)}e', *embedding)
+    
+    @staticmethod
+    def _unpack_half(blob):
+        if NUMPY_AVAILABLE:
+            return np.frombuffer(blob, dtype='<f2').astype(np.float32)
+        return list(struct.unpack(f'<{len(blob) // 2}e', blob))
+    
+    def _embed_query(self, query: str):
+        """Get a query embedding, reusing one cached in the database.
+        
+        Repeated queries skip the API round trip. Only the newest
+        QUERY_CACHE_SIZE entries are kept.
+        """
+        key_source = '\0'.join((
+            self.config.get('base_url', ''),
+            self.config.get('model', 'text-embedding-3-small'),
+            query,
+        ))
+        key = hashlib.sha1(key_source.encode('utf-8')).hexdigest()
+        
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT embedding FROM query_cache WHERE key = ?', (key,)).fetchone()
+            if row:
+                return self._unpack_embedding(row[0])
             
-            if response.status_code == 200:
-                data = response.json()
-                if 'data' in data and len(data['data']) > 0:
-                    return data['data'][0]['embedding']
+            embedding = self._get_embedding(query)
+            if not embedding:
+                return None
             
-        except Exception as e:
-            pass
+            conn.execute(
+                'INSERT OR REPLACE INTO query_cache (key, embedding, created) VALUES (?, ?, ?)',
+                (key, self._pack_embedding(embedding), time.time())
+            )
+            conn.execute(
+                '''DELETE FROM query_cache WHERE key NOT IN (
+                       SELECT key FROM query_cache ORDER BY created DESC LIMIT ?
+                   )''',
+                (self.QUERY_CACHE_SIZE,)
+            )
+            conn.commit()
+            return embedding
+        finally:
+            conn.close()
+    
+    def cached_results(self, query: str, key: str) -> Optional[list]:
+        """Results stored by cache_results for a near-duplicate query.
+        
+        Matches entries with the same key, younger than RESULT_CACHE_TTL,
+        whose query embedding has cosine similarity of at least
+        RESULT_CACHE_SIMILARITY with this one. Returns None on a miss.
+        """
+        query_embedding = self._embed_query(query)
+        if query_embedding is None:
+            return None
         
-        return None
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                'SELECT embedding, results FROM result_cache WHERE key = ? AND created >= ?',
+                (key, time.time() - self.RESULT_CACHE_TTL)
+            ).fetchall()
+        finally:
+            conn.close()
+        
+        embeddings = []
+        for blob, _ in rows:
+            embedding = self._unpack_embedding(blob)
+            embeddings.append(embedding if len(embedding) == len(query_embedding) else [0.0] * len(query_embedding))
+        similarities = self._similarities(query_embedding, embeddings)
+        if not similarities:
+            return None
+        best = max(range(len(similarities)), key=similarities.__getitem__)
+        if similarities[best] < self.RESULT_CACHE_SIMILARITY:
+            return None
+        return json.loads(rows[best][1])
     
-    def _cosine_similarity(self, a: List[float], b: List[float]) -> float:
-        """Calculate cosine similarity between two vectors."""
-        if not a or not b or len(a) != len(b):
-            return 0.0
+    def cache_results(self, query: str, key: str, results: list):
+        """Store search results for cached_results, dropping expired entries."""
+        query_embedding = self._embed_query(query)
+        if query_embedding is None:
+            return
         
-        dot_product = sum(x * y for x, y in zip(a, b))
-        norm_a = sum(x * x for x in a) ** 0.5
-        norm_b = sum(x * x for x in b) ** 0.5
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT INTO result_cache (key, embedding, results, created) VALUES (?, ?, ?, ?)',
+                (key, self._pack_embedding(query_embedding), json.dumps(results, ensure_ascii=False), now)
+            )
+            conn.execute(
+                '''DELETE FROM result_cache WHERE created < ? OR id NOT IN (
+                       SELECT id FROM result_cache ORDER BY created DESC LIMIT ?
+                   )''',
+                (now - self.RESULT_CACHE_TTL, self.RESULT_CACHE_SIZE)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _normalize(vector):
+        """Scale a vector to unit length (zero vectors are returned as is)."""
+        if NUMPY_AVAILABLE:
+            v = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(v)
+            return v / norm if norm > 0 else v
+        norm = sum(x * x for x in vector) ** 0.5
+        return [x / norm for x in vector] if norm > 0 else list(vector)
+    
+    def _similarities(self, query: List[float], embeddings: List[List[float]]) -> List[float]:
+        """Cosine similarity of query against each stored embedding.
         
-        if norm_a == 0 or norm_b == 0:
-            return 0.0
+        Stored embeddings are unit vectors, so once the query is normalized
+        cosine similarity is a plain dot product. With numpy all embeddings
+        are stacked into one float32 matrix and scored with a single
+        matrix-vector product.
+        """
+        q = self._normalize(query)
+        if not NUMPY_AVAILABLE:
+            return [sum(x * y for x, y in zip(q, e)) for e in embeddings]
+        if not embeddings:
+            return []
         
-        return dot_product / (norm_a * norm_b)
+        return (np.asarray(embeddings, dtype=np.float32) @ q).tolist()
+    
+    @staticmethod
+    def _pack_embedding(embedding: List[float]) -> bytes:
+        """Serialize an embedding as raw float32 bytes of its unit vector."""
+        embedding = SemanticEngine._normalize(embedding)
+        if NUMPY_AVAILABLE:
+            return embedding.tobytes()
+        return array('f', embedding).tobytes()
+    
+    @staticmethod
+    def _unpack_embedding(blob):
+        """Decode a stored embedding (float32 bytes, or JSON text from older indexes)."""
+        if isinstance(blob, str):
+            return SemanticEngine._normalize(json.loads(blob))
+        if NUMPY_AVAILABLE:
+            return np.frombuffer(blob, dtype=np.float32)
+        vector = array('f')
+        vector.frombytes(blob)
+        return vector
     
-    def _file_hash(self, filepath: Path) -> str:
-        """Get hash of file content."""
+    @staticmethod
+    def _hash_algorithm(file_hash: str) -> str:
+        """Algorithm a stored hash was made with (bare hex digests are MD5)."""
+        return file_hash.split(':', 1)[0] if ':' in file_hash else 'md5'
+    
+    def _file_hash(self, filepath: Path, algorithm: str = HASH_ALGORITHM) -> str:
+        """Get hash of file content.
+        
+        MD5 digests are bare hex, as in indexes built before other algorithms
+        were supported; others are prefixed with the algorithm name.
+        """
         try:
-            content = filepath.read_bytes()
-            return hashlib.md5(content).hexdigest()
+            if algorithm == 'xxh3':
+                hasher, prefix = xxhash.xxh3_128(), 'xxh3:'
+            elif algorithm == 'blake3':
+                hasher, prefix = blake3.blake3(), 'blake3:'
+            else:
+                hasher, prefix = hashlib.md5(), ''
+            
+            # Stream through one reused buffer instead of reading the whole file
+            buffer = bytearray(self.HASH_BLOCK_SIZE)
+            view = memoryview(buffer)
+            with open(filepath, 'rb', buffering=0) as f:
+                while True:
+                    n = f.readinto(buffer)
+                    if not n:
+                        break
+                    hasher.update(view[:n])
+            return prefix + hasher.hexdigest()
         except Exception:
             return ''
     
@@ -185,30 +579,38 @@ class SemanticEngine:
         except Exception:
             return []
         
-        lines = content.split('\n')
+        # Walk line boundaries and slice each chunk out of content once,
+        # instead of collecting line lists and joining them.
         chunks = []
-        current_chunk = []
+        split_re = self._SPLIT_RE
+        chunk_off = 0           # offset of the current chunk's first line
         current_start = 1
         current_size = 0
+        pos = 0                 # offset of line i
+        i = 0
+        length = len(content)
         
-        for i, line in enumerate(lines, 1):
-            current_chunk.append(line)
-            current_size += len(line)
+        while True:
+            i += 1
+            end = content.find('\n', pos)
+            if end == -1:
+                end = length
+            current_size += end - pos
             
             # Check if we should start a new chunk
             should_split = False
             
             # Split at function/class definitions
             if current_size >= self.CHUNK_SIZE:
-                if re.match(r'^(def |class |function |async function |export )', line.strip()):
+                if split_re.match(content, pos, end):
                     should_split = True
                 elif current_size >= self.CHUNK_SIZE * 2:
                     # Force split if chunk is too large
                     should_split = True
             
-            if should_split and len(current_chunk) > 1:
+            if should_split and pos > chunk_off:
                 # Save current chunk (excluding the new definition line)
-                chunk_content = '\n'.join(current_chunk[:-1])
+                chunk_content = content[chunk_off:pos - 1]
                 if chunk_content.strip():
                     chunks.append({
                         'content': chunk_content,
@@ -217,105 +619,648 @@ class SemanticEngine:
                     })
                 
                 # Start new chunk with current line
-                current_chunk = [line]
+                chunk_off = pos
                 current_start = i
-                current_size = len(line)
+                current_size = end - pos
+            
+            if end == length:
+                break
+            pos = end + 1
         
         # Don't forget the last chunk
-        if current_chunk:
-            chunk_content = '\n'.join(current_chunk)
-            if chunk_content.strip():
-                chunks.append({
-                    'content': chunk_content,
-                    'start_line': current_start,
-                    'end_line': len(lines),
-                })
+        chunk_content = content[chunk_off:]
+        if chunk_content.strip():
+            chunks.append({
+                'content': chunk_content,
+                'start_line': current_start,
+                'end_line': i,
+            })
         
         return chunks
     
-    def index_file(self, filepath: Path) -> int:
+    def index_file(self, filepath: Path, conn: Optional[sqlite3.Connection] = None) -> int:
         """
         Index a single file for semantic search.
         
+        With conn (autocommit mode), the file is written through that
+        connection, inside its open transaction if there is one, and the ANN
+        index is left for the caller to update with _flush_ann.
+        
         Returns number of chunks indexed.
         """
-        file_hash = self._file_hash(filepath)
-        if not file_hash:
+        prepared = self._prepare_file(filepath)
+        if prepared is None:
             return 0
+        if conn is not None:
+            return self._store_file(conn, *prepared)
         
+        conn = self._connect()
+        conn.isolation_level = None  # transactions are explicit in _store_file
         try:
+            indexed_count = self._store_file(conn, *prepared)
+            self._flush_ann(conn)
+            return indexed_count
+        finally:
+            conn.close()
+    
+    def _prepare_file(self, filepath: Path) -> Optional[Tuple[str, str, Optional[List[Dict[str, Any]]], Optional[list], int, int]]:
+        """Chunk and embed a file that needs (re)indexing.
+        
+        Only reads the database, so it can run on worker threads. Returns
+        (rel_path, file_hash, chunks, embeddings, mtime_ns, size), or None if
+        the file is unreadable or unchanged since it was indexed. A file whose
+        mtime or size changed but whose content did not comes back with
+        chunks and embeddings set to None, so only its metadata is updated.
+        """
+        return self._prepare_files([filepath])[0]
+    
+    def _prepare_files(self, filepaths: List[Path]) -> list:
+        """_prepare_file for several files, one result per file.
+        
+        The new chunks of all files are embedded together, so a group of
+        small files shares full EMBED_BATCH_SIZE requests instead of sending
+        a small request each.
+        """
+        prepared = []
+        texts = []
+        conn = self._connect()
+        try:
+            for filepath in filepaths:
+                result = self._check_file(conn, filepath)
+                if result is not None and result[2] is not None:
+                    texts.extend(chunk['content'] for chunk in result[2])
+                prepared.append(result)
+        finally:
+            conn.close()
+        
+        # Embed new chunks in batched requests and hand them back per file
+        embeddings = self._get_cached_embeddings(texts)
+        offset = 0
+        for i, result in enumerate(prepared):
+            if result is None or result[2] is None:
+                continue
+            rel_path, file_hash, chunks, _, mtime_ns, size = result
+            prepared[i] = (rel_path, file_hash, chunks, embeddings[offset:offset + len(chunks)], mtime_ns, size)
+            offset += len(chunks)
+        return prepared
+    
+    def _check_file(self, conn: sqlite3.Connection, filepath: Path):
+        """_prepare_file up to embedding: chunks are returned, embeddings are None."""
+        try:
+            stat = filepath.stat()
             rel_path = str(filepath.relative_to(self.project_root))
+        except OSError:
+            return None
         except ValueError:
             rel_path = str(filepath)
         
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
+        # Unchanged mtime and size: skip reading and hashing the file
+        meta = conn.execute(
+            'SELECT mtime_ns, size, file_hash FROM file_meta WHERE path = ?',
+            (rel_path,)
+        ).fetchone()
+        if meta and meta[0] == stat.st_mtime_ns and meta[1] == stat.st_size:
+            return None
+        
+        file_hash = self._file_hash(filepath)
+        if not file_hash:
+            return None
         
         # Check if file is already indexed with same hash
-        cursor.execute(
-            'SELECT id FROM chunks WHERE file_path = ? AND file_hash = ? LIMIT 1',
-            (rel_path, file_hash)
-        )
-        if cursor.fetchone():
-            conn.close()
-            return 0  # Already indexed
+        stored = conn.execute(
+            'SELECT file_hash FROM chunks WHERE file_path = ? LIMIT 1',
+            (rel_path,)
+        ).fetchone()
+        
+        indexed = False
+        if stored:
+            stored_hash = stored[0]
+            algorithm = self._hash_algorithm(stored_hash)
+            if algorithm != HASH_ALGORITHM:
+                # Indexed with another algorithm: compare with that one, so
+                # switching algorithms does not re-embed unchanged files
+                indexed = self._file_hash(filepath, algorithm) == stored_hash
+            else:
+                indexed = stored_hash == file_hash
         
-        # Delete old chunks for this file
-        cursor.execute('DELETE FROM chunks WHERE file_path = ?', (rel_path,))
+        if indexed:
+            return rel_path, file_hash, None, None, stat.st_mtime_ns, stat.st_size
+        
+        return rel_path, file_hash, self._chunk_file(filepath), None, stat.st_mtime_ns, stat.st_size
+    
+    def _store_file(
+        self,
+        conn: sqlite3.Connection,
+        rel_path: str,
+        file_hash: str,
+        chunks: Optional[List[Dict[str, Any]]],
+        embeddings: Optional[list],
+        mtime_ns: int,
+        size: int
+    ) -> int:
+        """Replace a file's chunks, embeddings and metadata atomically.
         
-        # Chunk the file
-        chunks = self._chunk_file(filepath)
+        With chunks None only the file_meta row is updated. conn must be in
+        autocommit mode (isolation_level=None); the file gets its own
+        transaction, or a savepoint within the caller's. Returns the number
+        of embeddings stored.
+        """
+        cursor = conn.cursor()
         indexed_count = 0
         
-        for i, chunk in enumerate(chunks):
-            # Insert chunk
+        own_transaction = not conn.in_transaction
+        cursor.execute('BEGIN IMMEDIATE' if own_transaction else 'SAVEPOINT store_file')
+        try:
             cursor.execute(
-                '''INSERT INTO chunks (file_path, file_hash, chunk_index, content, start_line, end_line)
-                   VALUES (?, ?, ?, ?, ?, ?)''',
-                (rel_path, file_hash, i, chunk['content'], chunk['start_line'], chunk['end_line'])
+                'INSERT OR REPLACE INTO file_meta (path, mtime_ns, size, file_hash) VALUES (?, ?, ?, ?)',
+                (rel_path, mtime_ns, size, file_hash)
             )
-            chunk_id = cursor.lastrowid
-            
-            # Get embedding
-            embedding = self._get_embedding(chunk['content'])
-            if embedding:
-                # Store as JSON (could use numpy/pickle for efficiency)
+            if chunks is None:
+                # Content unchanged; record the hash in the current algorithm
                 cursor.execute(
-                    'INSERT OR REPLACE INTO embeddings (chunk_id, embedding) VALUES (?, ?)',
-                    (chunk_id, json.dumps(embedding))
+                    'UPDATE chunks SET file_hash = ? WHERE file_path = ?',
+                    (file_hash, rel_path)
                 )
-                indexed_count += 1
-        
-        conn.commit()
-        conn.close()
+                cursor.execute('COMMIT' if own_transaction else 'RELEASE store_file')
+                return 0
+            
+            # Delete old chunks for this file, and their embeddings
+            old_ids = [row[0] for row in cursor.execute(
+                'SELECT id FROM chunks WHERE file_path = ?', (rel_path,)
+            )]
+            cursor.execute(
+                'DELETE FROM embeddings WHERE chunk_id IN (SELECT id FROM chunks WHERE file_path = ?)',
+                (rel_path,)
+            )
+            cursor.execute('DELETE FROM chunks WHERE file_path = ?', (rel_path,))
+            
+            # Allocate chunk ids up front (the write lock is held), so chunks
+            # and embeddings can each go in with a single executemany
+            last_id = cursor.execute(
+                '''SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'chunks'), 0),
+                           COALESCE((SELECT MAX(id) FROM chunks), 0))'''
+            ).fetchone()[0]
+            chunk_rows = []
+            embedding_rows = []
+            cache_rows = []
+            added = []
+            now = time.time()
+            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+                chunk_id = last_id + 1 + i
+                chunk_rows.append(
+                    (chunk_id, rel_path, file_hash, i, chunk['content'], chunk['start_line'], chunk['end_line'])
+                )
+                if embedding is not None and len(embedding):
+                    embedding_rows.append((chunk_id, self._pack_embedding(embedding)))
+                    cache_rows.append((self._embedding_key(chunk['content']), self._pack_half(embedding), now))
+                    added.append((chunk_id, embedding))
+            
+            cursor.executemany(
+                '''INSERT INTO chunks (id, file_path, file_hash, chunk_index, content, start_line, end_line)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                chunk_rows
+            )
+            cursor.executemany(
+                'INSERT OR REPLACE INTO embeddings (chunk_id, embedding) VALUES (?, ?)',
+                embedding_rows
+            )
+            cursor.executemany(
+                'INSERT OR REPLACE INTO embedding_cache (key, embedding, created) VALUES (?, ?, ?)',
+                cache_rows
+            )
+            indexed_count = len(embedding_rows)
+            
+            cursor.execute('COMMIT' if own_transaction else 'RELEASE store_file')
+        except Exception:
+            if own_transaction:
+                cursor.execute('ROLLBACK')
+            else:
+                cursor.execute('ROLLBACK TO store_file')
+                cursor.execute('RELEASE store_file')
+            raise
         
+        self._ann_removed.extend(old_ids)
+        self._ann_added.extend(added)
         return indexed_count
     
+    def _ann_path(self, dim: int) -> Path:
+        return self.db_path.with_name(f'semantic_index.{dim}.hnsw')
+    
+    def _open_ann(self, dim: int, conn: Optional[sqlite3.Connection] = None):
+        """Load the ANN index for dim-sized embeddings.
+        
+        Returns None if there is none on disk, unless conn is given: then a
+        new index is built from the stored embeddings, so an index is always
+        complete even when it is created after the database.
+        """
+        path = self._ann_path(dim)
+        index = hnswlib.Index(space='cosine', dim=dim)
+        if path.exists():
+            index.load_index(str(path))
+            return index
+        if conn is None:
+            return None
+        
+        ids = []
+        vectors = []
+        for chunk_id, blob in conn.execute(
+            'SELECT e.chunk_id, e.embedding FROM embeddings e JOIN chunks c ON c.id = e.chunk_id'
+        ):
+            try:
+                vector = self._unpack_embedding(blob)
+            except Exception:
+                continue
+            if len(vector) == dim:
+                ids.append(chunk_id)
+                vectors.append(vector)
+        
+        index.init_index(max_elements=max(len(ids), 1024), ef_construction=200, M=16)
+        if ids:
+            index.add_items(np.asarray(vectors, dtype=np.float32), ids)
+        return index
+    
+    def _flush_ann(self, conn: sqlite3.Connection):
+        """Apply chunk changes recorded by _store_file to the ANN index on disk."""
+        removed, self._ann_removed = self._ann_removed, []
+        added, self._ann_added = self._ann_added, []
+        if not removed and not added:
+            return
+        self._invalidate_matrix()
+        conn.execute('DELETE FROM result_cache')  # may hold outdated results
+        
+        dims = {len(vector) for _, vector in added}
+        if not HNSWLIB_AVAILABLE or len(dims) > 1:
+            # An index that missed these changes would return stale results
+            for path in self.db_path.parent.glob('semantic_index.*.hnsw'):
+                path.unlink()
+            return
+        
+        existing = sorted(self.db_path.parent.glob('semantic_index.*.hnsw'))
+        if not dims:
+            # Only deletions: update whichever index exists
+            if not existing:
+                return
+            dims = {int(existing[0].name.split('.')[1])}
+        dim = dims.pop()
+        for path in existing:
+            if path != self._ann_path(dim):
+                path.unlink()  # left over from a model with another dimension
+        
+        index = self._open_ann(dim, conn)
+        for chunk_id in removed:
+            try:
+                index.mark_deleted(chunk_id)
+            except RuntimeError:
+                pass  # not in the index (e.g. it was just built without it)
+        
+        if added:
+            needed = index.get_current_count() + len(added)
+            if needed > index.get_max_elements():
+                index.resize_index(max(needed, index.get_max_elements() * 2))
+            index.add_items(
+                np.asarray([vector for _, vector in added], dtype=np.float32),
+                [chunk_id for chunk_id, _ in added]
+            )
+        
+        index.save_index(str(self._ann_path(dim)))
+    
+    def _ann_candidates(self, query_embedding, limit: int) -> Optional[List[int]]:
+        """Chunk ids of the nearest stored embeddings, or None without an ANN index."""
+        if not HNSWLIB_AVAILABLE:
+            return None
+        
+        try:
+            index = self._open_ann(len(query_embedding))
+            if index is None:
+                return None
+            k = min(limit * self.ANN_CANDIDATES, index.get_current_count())
+            if k == 0:
+                return []
+            index.set_ef(max(k, 50))
+            labels, _ = index.knn_query(np.asarray(query_embedding, dtype=np.float32), k=k)
+        except RuntimeError:
+            return None  # e.g. too few live elements left for k
+        return [int(label) for label in labels[0]]
+    
+    def _matrix_paths(self, dim: int) -> Tuple[Path, Path]:
+        return (self.db_path.with_name(f'semantic_matrix.{dim}.f32'),
+                self.db_path.with_name(f'semantic_matrix.{dim}.ids'))
+    
+    def _invalidate_matrix(self):
+        """Drop the embedding matrix files; they are rebuilt on the next search."""
+        self._matrix = None  # unmap first, Windows cannot delete mapped files
+        self._gpu_matrix = None
+        self._quantized = None
+        for path in self.db_path.parent.glob('semantic_matrix.*'):
+            try:
+                path.unlink()
+            except OSError:
+                pass  # mapped by another process; the row count check catches it
+    
+    def _load_matrix(self, dim: int, conn: sqlite3.Connection):
+        """All stored embeddings as one memory-mapped (N, dim) float32 matrix.
+        
+        The rows are written to .duncrew once, in chunk id order next to a
+        parallel int64 array of chunk ids, so later searches score them with
+        a single matrix-vector product straight from the page cache instead
+        of reading and decoding every blob from SQLite. Returns (ids, matrix),
+        or None without numpy, with no embeddings, or when stored embeddings
+        differ in dimension.
+        """
+        if not NUMPY_AVAILABLE:
+            return None
+        
+        total = conn.execute(
+            'SELECT COUNT(*) FROM embeddings e JOIN chunks c ON c.id = e.chunk_id'
+        ).fetchone()[0]
+        if total == 0:
+            return None
+        if self._matrix is not None and self._matrix[0] == dim and len(self._matrix[1]) == total:
+            return self._matrix[1:]
+        
+        matrix_path, ids_path = self._matrix_paths(dim)
+        try:
+            ids = np.fromfile(ids_path, dtype=np.int64)
+            if len(ids) != total or matrix_path.stat().st_size != total * dim * 4:
+                ids = None  # stale: written before the last index change
+        except OSError:
+            ids = None
+        
+        if ids is None:
+            ids = np.empty(total, dtype=np.int64)
+            vectors = np.empty((total, dim), dtype=np.float32)
+            n = 0
+            for chunk_id, blob in conn.execute(
+                '''SELECT e.chunk_id, e.embedding FROM embeddings e
+                   JOIN chunks c ON c.id = e.chunk_id ORDER BY e.chunk_id'''
+            ):
+                try:
+                    vector = self._unpack_embedding(blob)
+                except Exception:
+                    continue
+                if len(vector) != dim or n == total:
+                    return None
+                ids[n] = chunk_id
+                vectors[n] = vector
+                n += 1
+            if n == 0:
+                return None
+            ids, vectors = ids[:n], vectors[:n]
+            
+            try:
+                for path, data in ((matrix_path, vectors), (ids_path, ids)):
+                    tmp = path.with_name(path.name + '.tmp')
+                    data.tofile(tmp)
+                    os.replace(tmp, path)
+            except OSError:
+                return ids, vectors  # still usable for this search
+        
+        matrix = np.memmap(matrix_path, dtype=np.float32, mode='r', shape=(len(ids), dim))
+        self._matrix = (dim, ids, matrix)
+        return ids, matrix
+    
+    def _matrix_search(
+        self,
+        query_embedding,
+        conn: sqlite3.Connection,
+        conditions: List[str],
+        params: list,
+        limit: int
+    ) -> Optional[Tuple[list, list]]:
+        """Best chunks by cosine similarity, scored on the embedding matrix.
+        
+        Returns (rows, similarities) shaped like the SQL scan in search, or
+        None if there is no usable matrix.
+        """
+        matrix = self._load_matrix(len(query_embedding), conn)
+        if matrix is None:
+            return None
+        ids, mat = matrix
+        q = self._normalize(query_embedding)
+        
+        quantized = None
+        if len(mat) >= self.QUANTIZED_MIN_ROWS and not (CUPY_AVAILABLE and len(mat) >= self.GPU_MIN_ROWS):
+            quantized = self._load_quantized(mat)
+        if quantized is not None:
+            scores = self._score_quantized(*quantized, q)
+        else:
+            scores = self._score_matrix(mat, q)
+        
+        positions = np.arange(len(ids))
+        if conditions:
+            allowed = np.fromiter(
+                (row[0] for row in conn.execute(
+                    'SELECT c.id FROM chunks c WHERE ' + ' AND '.join(conditions), params
+                )),
+                dtype=np.int64
+            )
+            positions = np.flatnonzero(np.isin(ids, allowed))
+        if quantized is not None:
+            # Rescore the approximate best rows exactly from the float32 matrix
+            k = limit * self.QUANTIZED_RERANK
+            if len(positions) > k:
+                positions = np.sort(positions[np.argpartition(-scores[positions], k - 1)[:k]])
+            scores[positions] = mat[positions] @ q
+        if len(positions) > limit:
+            top = np.argpartition(-scores[positions], limit - 1)[:limit]
+            positions = positions[top]
+        positions = positions[np.argsort(-scores[positions], kind='stable')]
+        
+        top_ids = ids[positions].tolist()
+        if not top_ids:
+            return [], []
+        by_id = {
+            row[0]: row[1:] + (None,)
+            for row in conn.execute(
+                f'''SELECT c.id, c.file_path, c.content, c.start_line, c.end_line
+                    FROM chunks c WHERE c.id IN ({",".join("?" * len(top_ids))})''',
+                top_ids
+            )
+        }
+        rows = []
+        similarities = []
+        for chunk_id, score in zip(top_ids, scores[positions].tolist()):
+            if chunk_id in by_id:
+                rows.append(by_id[chunk_id])
+                similarities.append(score)
+        return rows, similarities
+    
+    def _load_quantized(self, mat):
+        """int8 copy of mat with a float32 scale per row, memory-mapped.
+        
+        Each row is stored as round(v / s) with s = max(|v|) / 127, so
+        s * (row @ q) approximates v @ q while reading a quarter of the bytes.
+        Returns (rows, scales), or None if the files cannot be written.
+        """
+        if self._quantized is not None and self._quantized[0] is mat:
+            return self._quantized[1:]
+        if not isinstance(mat, np.memmap):
+            return None  # matrix files could not be written
+        
+        n, dim = mat.shape
+        base = Path(mat.filename)
+        rows_path = base.with_suffix('.i8')
+        scales_path = base.with_suffix('.scale')
+        try:
+            if rows_path.stat().st_size != n * dim or scales_path.stat().st_size != n * 4:
+                raise FileNotFoundError  # stale
+        except OSError:
+            try:
+                with open(rows_path.with_name(rows_path.name + '.tmp'), 'wb') as f:
+                    scales = np.empty(n, dtype=np.float32)
+                    for start in range(0, n, 4096):
+                        block = np.asarray(mat[start:start + 4096])
+                        block_scales = np.abs(block).max(axis=1) / 127
+                        block_scales[block_scales == 0] = 1  # all-zero rows stay zero
+                        np.rint(block / block_scales[:, None]).astype(np.int8).tofile(f)
+                        scales[start:start + 4096] = block_scales
+                os.replace(rows_path.with_name(rows_path.name + '.tmp'), rows_path)
+                scales.tofile(scales_path)
+            except OSError:
+                return None
+        
+        rows = np.memmap(rows_path, dtype=np.int8, mode='r', shape=(n, dim))
+        scales = np.fromfile(scales_path, dtype=np.float32)
+        self._quantized = (mat, rows, scales)
+        return rows, scales
+    
+    @staticmethod
+    def _score_quantized(rows, scales, q):
+        """Approximate mat @ q from the int8 rows.
+        
+        Rows are widened to float32 a block at a time, so the temporary copy
+        stays in cache and memory traffic is one byte per element.
+        """
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), 256):
+            scores[start:start + 256] = rows[start:start + 256].astype(np.float32) @ q
+        scores *= scales
+        return scores
+    
+    def _score_matrix(self, mat, q):
+        """mat @ q, on the GPU when cupy is available and mat is large."""
+        if not CUPY_AVAILABLE or len(mat) < self.GPU_MIN_ROWS:
+            return mat @ q
+        try:
+            if self._gpu_matrix is None or self._gpu_matrix[0] is not mat:
+                self._gpu_matrix = (mat, cupy.asarray(mat))
+            return cupy.asnumpy(self._gpu_matrix[1] @ cupy.asarray(q))
+        except Exception:  # e.g. out of GPU memory
+            self._gpu_matrix = None
+            return mat @ q
+    
+    def _iter_indexable(self, search_path: Path, stats: Dict[str, int]):
+        """Yield indexable files under search_path, counting skipped ones.
+        
+        Same order and selection as os.walk with a Path.suffix check, but
+        works on scandir entry names and only builds Paths for files that
+        are yielded.
+        """
+        suffixes = tuple(self.INDEXABLE_EXTENSIONS)
+        
+        def scan(directory):
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                return
+            
+            subdirs = []
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    # Skip ignored directories; like os.walk, do not follow links
+                    if entry.name not in self.SKIP_DIRS and not entry.is_symlink():
+                        subdirs.append(entry.path)
+                    continue
+                
+                name = entry.name
+                # A bare '.py' has no suffix, as with Path.suffix
+                if not name.endswith(suffixes) or name in self.INDEXABLE_EXTENSIONS:
+                    stats['skipped'] += 1
+                    continue
+                
+                yield Path(entry.path)
+            
+            for subdir in subdirs:
+                yield from scan(subdir)
+        
+        return scan(search_path)
+    
     def index_directory(self, directory: Optional[Path] = None) -> Dict[str, int]:
         """
         Index all files in directory.
         
+        Files are chunked and embedded on EMBED_WORKERS threads, in groups of
+        EMBED_GROUP_FILES so that small files share embedding requests, and
+        many requests are in flight at once; results are written to the
+        database on this thread in walk order, up to INDEX_BATCH_FILES files
+        per transaction. A batch is also committed before waiting on a file
+        that is still being embedded, so the write lock is not held across
+        API calls.
+        
         Returns stats about indexing.
         """
         search_path = directory or self.project_root
         stats = {'files': 0, 'chunks': 0, 'skipped': 0}
         
-        for dirpath, dirnames, filenames in os.walk(search_path):
-            # Skip ignored directories
-            dirnames[:] = [d for d in dirnames if d not in self.SKIP_DIRS]
-            
-            for filename in filenames:
-                filepath = Path(dirpath) / filename
-                
-                if filepath.suffix not in self.INDEXABLE_EXTENSIONS:
-                    stats['skipped'] += 1
+        # One writer connection for the whole run
+        conn = self._connect()
+        conn.isolation_level = None  # transactions are explicit
+        batched = 0
+        
+        def store(future):
+            nonlocal batched
+            if conn.in_transaction and (batched >= self.INDEX_BATCH_FILES or not future.done()):
+                conn.execute('COMMIT')
+                batched = 0
+            for prepared in future.result():
+                if prepared is None:
                     continue
-                
-                chunks_indexed = self.index_file(filepath)
+                if not conn.in_transaction:
+                    conn.execute('BEGIN IMMEDIATE')
+                batched += 1
+                chunks_indexed = self._store_file(conn, *prepared)
                 if chunks_indexed > 0:
                     stats['files'] += 1
                     stats['chunks'] += chunks_indexed
         
+        pending = deque()
+        window = self.EMBED_WORKERS * 2
+        group = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.EMBED_WORKERS) as executor:
+                for filepath in self._iter_indexable(search_path, stats):
+                    group.append(filepath)
+                    if len(group) < self.EMBED_GROUP_FILES:
+                        continue
+                    pending.append(executor.submit(self._prepare_files, group))
+                    group = []
+                    if len(pending) >= window:
+                        store(pending.popleft())
+                
+                if group:
+                    pending.append(executor.submit(self._prepare_files, group))
+                while pending:
+                    store(pending.popleft())
+            if conn.in_transaction:
+                conn.execute('COMMIT')
+            self._flush_ann(conn)
+            conn.execute(
+                '''DELETE FROM embedding_cache WHERE key NOT IN (
+                       SELECT key FROM embedding_cache ORDER BY created DESC LIMIT ?
+                   )''',
+                (self.EMBED_CACHE_SIZE,)
+            )
+        finally:
+            if conn.in_transaction:
+                conn.execute('COMMIT')  # keep the files stored before an error
+            conn.execute('PRAGMA optimize')
+            conn.close()
+        
         return stats
     
     def search(
@@ -323,7 +1268,8 @@ class SemanticEngine:
         query: str,
         scope: Optional[str] = None,
         language: Optional[str] = None,
-        limit: int = 10
+        limit: int = 10,
+        cancelled: Optional[threading.Event] = None
     ) -> List[Dict[str, Any]]:
         """
         Semantic search using embeddings.
@@ -333,17 +1279,18 @@ class SemanticEngine:
             scope: Directory to search in
             language: Language filter
             limit: Maximum results
+            cancelled: When set, return [] instead of requesting an embedding
             
         Returns:
             List of matching chunks with similarity scores
         """
-        # Get query embedding
-        query_embedding = self._get_embedding(query)
-        if not query_embedding:
+        if cancelled is not None and cancelled.is_set():
             return []
         
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
+        # Get query embedding
+        query_embedding = self._embed_query(query)
+        if query_embedding is None:
+            return []
         
         # Build query
         sql = '''
@@ -369,22 +1316,58 @@ class SemanticEngine:
                 conditions.append('c.file_path LIKE ?')
                 params.append(f'%{ext_map[language.lower()]}')
         
-        if conditions:
-            sql += ' WHERE ' + ' AND '.join(conditions)
+        conn = self._connect()
+        cursor = conn.cursor()
         
-        cursor.execute(sql, params)
-        rows = cursor.fetchall()
+        # Score only the ANN neighbours when an index exists; fall back to a
+        # full scan if the filters leave fewer than limit of them
+        rows = None
+        similarities = None
+        candidate_ids = self._ann_candidates(query_embedding, limit)
+        if candidate_ids:
+            id_condition = f'c.id IN ({",".join("?" * len(candidate_ids))})'
+            cursor.execute(
+                sql + ' WHERE ' + ' AND '.join(conditions + [id_condition]),
+                params + candidate_ids
+            )
+            rows = cursor.fetchall()
+            if len(rows) < limit and len(candidate_ids) >= limit * self.ANN_CANDIDATES:
+                rows = None
+        
+        if rows is None:
+            # Full scan: score the memory-mapped embedding matrix if possible
+            scanned = self._matrix_search(query_embedding, conn, conditions, params, limit)
+            if scanned is not None:
+                candidates, similarities = scanned
+            else:
+                if conditions:
+                    sql += ' WHERE ' + ' AND '.join(conditions)
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
         conn.close()
         
-        # Calculate similarities
+        if similarities is None:
+            # Decode embeddings; rows that fail or differ in dimension score 0 as before
+            candidates = []
+            embeddings = []
+            for row in rows:
+                try:
+                    embedding = self._unpack_embedding(row[4])
+                    if len(embedding) != len(query_embedding):
+                        embedding = [0.0] * len(query_embedding)
+                except Exception:
+                    continue
+                candidates.append(row)
+                embeddings.append(embedding)
+            
+            # Calculate similarities
+            similarities = self._similarities(query_embedding, embeddings)
+        
         results = []
-        for row in rows:
-            file_path, content, start_line, end_line, embedding_json = row
+        for row, similarity in zip(candidates, similarities):
+            file_path, content, start_line, end_line, _ = row
             
             try:
-                embedding = json.loads(embedding_json)
-                similarity = self._cosine_similarity(query_embedding, embedding)
-                
                 # Extract the most relevant line
                 lines = content.split('\n')
                 match_line = lines[0] if lines else ''
@@ -406,7 +1389,7 @@ class SemanticEngine:
     
     def get_stats(self) -> Dict[str, int]:
         """Get index statistics."""
-        conn = sqlite3.connect(str(self.db_path))
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('SELECT COUNT(*) FROM chunks')
@@ -4,9 +4,12 @@ Tree-sitter based AST search engine for code-search skill.
 Provides accurate symbol lookup (definitions, references, calls).
 """
 
+import io
+import multiprocessing
 import os
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Set
+from typing import List, Dict, Any, Optional, Set, Tuple
 import re
 
 # Try to import tree-sitter-languages (provides pre-built parsers)
@@ -57,10 +60,18 @@ class TreeSitterEngine:
         },
     }
     
+    # Parsed files kept for reuse across searches
+    TREE_CACHE_SIZE = 512
+    # Uncached files per worker process below which search_symbol stays serial
+    PARALLEL_MIN_FILES = 100
+    
     def __init__(self, project_root: str):
         self.project_root = Path(project_root)
         self.available = TREE_SITTER_AVAILABLE
         self._parser_cache: Dict[str, Any] = {}
+        self._query_cache: Dict[Tuple[str, str], Any] = {}
+        # filepath -> (mtime_ns, size, tree, code, code_bytes), least recently used first
+        self._tree_cache: 'OrderedDict[Path, Tuple[int, int, Any, str, bytes]]' = OrderedDict()
     
     def _get_parser(self, language: str):
         """Get or create parser for a language."""
@@ -80,7 +91,8 @@ class TreeSitterEngine:
         self,
         symbol: str,
         relation: str = 'definition',
-        scope: Optional[str] = None
+        scope: Optional[str] = None,
+        only_files: Optional[set] = None
     ) -> List[Dict[str, Any]]:
         """
         Search for symbol definitions and references.
@@ -89,6 +101,8 @@ class TreeSitterEngine:
             symbol: Symbol name to search for
             relation: Type of relationship ('definition', 'calls', 'called_by', 'references')
             scope: Directory to search in
+            only_files: Optional normalized absolute paths already known to contain
+                the symbol text; other files are skipped without being read
             
         Returns:
             List of symbol locations
@@ -101,37 +115,145 @@ class TreeSitterEngine:
         if scope:
             search_path = self.project_root / scope
         
+        contains = self._symbol_prefilter(symbol, relation)
+        
         # Walk through files
+        files = []
         for filepath in self._iter_source_files(search_path):
-            lang = self._detect_language(filepath)
-            if not lang:
-                continue
-            
-            parser = self._get_parser(lang)
-            if not parser:
-                continue
-            
-            try:
-                with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                    code = f.read()
-                
-                tree = parser.parse(code.encode('utf-8'))
-                matches = self._search_in_tree(tree, code, symbol, relation, lang)
-                
-                for match in matches:
-                    try:
-                        rel_path = str(filepath.relative_to(self.project_root))
-                    except ValueError:
-                        rel_path = str(filepath)
-                    
-                    match['file'] = rel_path
-                    results.append(match)
-                    
-            except Exception as e:
+            if only_files is not None and os.path.normpath(os.path.abspath(filepath)) not in only_files:
                 continue
+            lang = self._detect_language(filepath)
+            if lang and self._get_parser(lang):
+                files.append((filepath, lang))
+        
+        # Parsing is CPU-bound, so files without a cached tree are searched
+        # on a process pool when there are enough of them. Workers keep their
+        # own trees, so only files searched here populate the tree cache.
+        per_file: Dict[int, List[Dict[str, Any]]] = {}
+        uncached = [i for i, (filepath, _) in enumerate(files) if not self._is_cached(filepath)]
+        cpus = os.cpu_count() or 1
+        if cpus > 1 and contains is not None and only_files is None and len(uncached) >= 2 * self.PARALLEL_MIN_FILES:
+            # Drop files without the symbol text before sizing the pool, so
+            # it is only started for files that actually need parsing
+            candidates = []
+            for i in uncached:
+                if self._file_contains(files[i][0], contains):
+                    candidates.append(i)
+                else:
+                    per_file[i] = []
+            uncached = candidates
+        
+        workers = min(cpus, len(uncached) // self.PARALLEL_MIN_FILES)
+        if workers > 1:
+            jobs = [(str(files[i][0]), symbol, relation, files[i][1]) for i in uncached]
+            # A few shards per worker: few round trips, balanced load
+            chunksize = -(-len(jobs) // (workers * 4))
+            with multiprocessing.Pool(workers, _init_worker, (str(self.project_root),)) as pool:
+                for i, matches in zip(uncached, pool.imap(_search_file_worker, jobs, chunksize)):
+                    per_file[i] = matches
+        
+        for i, (filepath, lang) in enumerate(files):
+            matches = per_file.get(i)
+            if matches is None:
+                matches = self._search_file(filepath, symbol, relation, lang, contains)
+            results.extend(matches)
         
         return results
     
+    def _search_file(
+        self,
+        filepath: Path,
+        symbol: str,
+        relation: str,
+        lang: str,
+        contains=None
+    ) -> List[Dict[str, Any]]:
+        """Search one source file; unreadable or unparsable files yield nothing."""
+        try:
+            parsed = self._parse_file(filepath, self._get_parser(lang), contains)
+            if parsed is None:
+                return []  # symbol text does not occur in the file
+            tree, code, code_bytes = parsed
+            matches = self._search_in_tree(tree, code, symbol, relation, lang, code_bytes)
+        except Exception:
+            return []
+        
+        try:
+            rel_path = str(filepath.relative_to(self.project_root))
+        except ValueError:
+            rel_path = str(filepath)
+        
+        for match in matches:
+            match['file'] = rel_path
+        return matches
+    
+    @staticmethod
+    def _file_contains(filepath: Path, contains) -> bool:
+        """Whether the file's bytes pass a _symbol_prefilter test (True if unreadable)."""
+        try:
+            with open(filepath, 'rb') as f:
+                return bool(contains(f.read()))
+        except OSError:
+            return True  # let the search itself deal with it
+    
+    def _is_cached(self, filepath: Path) -> bool:
+        """Whether the tree cache holds an up-to-date tree for filepath."""
+        cached = self._tree_cache.get(filepath)
+        if not cached:
+            return False
+        try:
+            stat = filepath.stat()
+        except OSError:
+            return False
+        return cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size
+    
+    def _symbol_prefilter(self, symbol: str, relation: str):
+        """Return a bytes test that every file with a match must pass, or None.
+        
+        A matching name always contains the symbol without its '*'
+        wildcards; definitions and calls also match case-insensitively,
+        which a bytes regex only folds for ASCII, so others are not filtered.
+        """
+        literal = symbol.strip('*')
+        if not literal:
+            return None
+        if relation == 'references':
+            needle = symbol.encode('utf-8')
+            return lambda data: needle in data
+        if not literal.isascii():
+            return None
+        return re.compile(re.escape(literal.encode('ascii')), re.IGNORECASE).search
+    
+    def _parse_file(self, filepath: Path, parser, contains=None) -> Optional[Tuple[Any, str, bytes]]:
+        """Parse a file, reusing the cached tree while its mtime and size match.
+        
+        With a `contains` test, files whose bytes fail it return None without
+        being decoded or parsed.
+        """
+        stat = filepath.stat()
+        cached = self._tree_cache.get(filepath)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            self._tree_cache.move_to_end(filepath)
+            if contains is not None and not contains(cached[4]):
+                return None
+            return cached[2], cached[3], cached[4]
+        
+        with open(filepath, 'rb') as f:
+            raw = f.read()
+        if contains is not None and not contains(raw):
+            return None
+        
+        # Same text as reading in text mode (universal newlines)
+        code = raw.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+        code_bytes = code.encode('utf-8')
+        tree = parser.parse(code_bytes)
+        
+        self._tree_cache[filepath] = (stat.st_mtime_ns, stat.st_size, tree, code, code_bytes)
+        self._tree_cache.move_to_end(filepath)
+        if len(self._tree_cache) > self.TREE_CACHE_SIZE:
+            self._tree_cache.popitem(last=False)
+        return tree, code, code_bytes
+    
     def _iter_source_files(self, root: Path) -> List[Path]:
         """Iterate over source files, skipping ignored directories."""
         ignore_dirs = {'.git', 'node_modules', '__pycache__', 'venv', 'dist', 'build', '.next', 'target'}
@@ -152,81 +274,122 @@ class TreeSitterEngine:
         """Detect language from file extension."""
         return self.EXTENSION_TO_LANGUAGE.get(filepath.suffix)
     
+    # Node types each relation looks at; definitions use DEFINITION_NODES
+    RELATION_NODES = {
+        'calls': ['call_expression', 'call'],
+        'references': ['identifier'],
+    }
+    
+    def _get_query(self, language: str, relation: str):
+        """Build (once) a tree-sitter Query capturing the nodes a relation checks.
+        
+        Node types the language's grammar does not have are left out; None if
+        none remain, since then nothing can match.
+        """
+        key = (language, relation)
+        if key not in self._query_cache:
+            if relation == 'definition':
+                node_types = [t for types in self.DEFINITION_NODES.get(language, {}).values() for t in types]
+            else:
+                node_types = self.RELATION_NODES.get(relation, [])
+            
+            query = None
+            try:
+                lang = tree_sitter_languages.get_language(language)
+                patterns = []
+                for node_type in dict.fromkeys(node_types):
+                    try:
+                        lang.query(f'({node_type}) @node')
+                    except Exception:
+                        continue  # not a node type of this grammar
+                    patterns.append(f'({node_type}) @node')
+                if patterns:
+                    query = lang.query('\n'.join(patterns))
+            except Exception:
+                pass
+            self._query_cache[key] = query
+        
+        return self._query_cache[key]
+    
     def _search_in_tree(
         self,
         tree,
         code: str,
         symbol: str,
         relation: str,
-        language: str
+        language: str,
+        code_bytes: Optional[bytes] = None
     ) -> List[Dict[str, Any]]:
-        """Search for symbol in parsed tree."""
+        """Search for symbol in parsed tree.
+        
+        Candidate nodes are enumerated by a tree-sitter Query in C, in
+        document order, instead of visiting every node from Python.
+        """
         results = []
-        code_bytes = code.encode('utf-8')
+        if code_bytes is None:
+            code_bytes = code.encode('utf-8')
         
-        def visit_node(node, parent_name=None):
-            """Recursively visit nodes."""
-            node_type = node.type
-            
-            # Get node text
-            start = node.start_byte
-            end = node.end_byte
-            node_text = code_bytes[start:end].decode('utf-8', errors='ignore')
+        query = self._get_query(language, relation)
+        if query is None:
+            return results
+        symbol_bytes = symbol.encode('utf-8')
+        
+        seen = set()
+        for node, _ in query.captures(tree.root_node):
+            # A node listed under two types would be captured twice
+            node_key = (node.start_byte, node.end_byte, node.type)
+            if node_key in seen:
+                continue
+            seen.add(node_key)
             
-            # Check for symbol matches based on relation type
             if relation == 'definition':
-                # Look for definition nodes
-                if self._is_definition_node(node_type, language):
-                    name = self._extract_definition_name(node, code_bytes)
-                    if name and self._matches_symbol(name, symbol):
-                        results.append({
-                            'line': node.start_point[0] + 1,
-                            'column': node.start_point[1],
-                            'match': self._get_line_at(code, node.start_point[0]),
-                            'symbol_name': name,
-                            'symbol_type': self._get_symbol_type(node_type),
-                            'relation': 'definition',
-                        })
-                        
+                name = self._extract_definition_name(node, code_bytes)
+                if name and self._matches_symbol(name, symbol):
+                    results.append({
+                        'line': node.start_point[0] + 1,
+                        'column': node.start_point[1],
+                        'match': self._line_of(code_bytes, node.start_byte),
+                        'symbol_name': name,
+                        'symbol_type': self._get_symbol_type(node.type),
+                        'relation': 'definition',
+                    })
+            
             elif relation == 'calls':
-                # Look for function calls
-                if node_type in ['call_expression', 'call']:
-                    callee = self._extract_callee_name(node, code_bytes)
-                    if callee and self._matches_symbol(callee, symbol):
-                        results.append({
-                            'line': node.start_point[0] + 1,
-                            'column': node.start_point[1],
-                            'match': self._get_line_at(code, node.start_point[0]),
-                            'symbol_name': callee,
-                            'relation': 'call',
-                            'context': parent_name,
-                        })
-                        
+                callee = self._extract_callee_name(node, code_bytes)
+                if callee and self._matches_symbol(callee, symbol):
+                    results.append({
+                        'line': node.start_point[0] + 1,
+                        'column': node.start_point[1],
+                        'match': self._line_of(code_bytes, node.start_byte),
+                        'symbol_name': callee,
+                        'relation': 'call',
+                        'context': self._enclosing_definition(node, code_bytes, language),
+                    })
+            
             elif relation == 'references':
-                # Look for any identifier usage
-                if node_type == 'identifier' and node_text == symbol:
+                # Compare raw bytes; no string is built for non-matching identifiers
+                if code_bytes[node.start_byte:node.end_byte] == symbol_bytes:
                     results.append({
                         'line': node.start_point[0] + 1,
                         'column': node.start_point[1],
-                        'match': self._get_line_at(code, node.start_point[0]),
+                        'match': self._line_of(code_bytes, node.start_byte),
                         'symbol_name': symbol,
                         'relation': 'reference',
                     })
-            
-            # Track current function/class name for context
-            current_name = parent_name
-            if self._is_definition_node(node_type, language):
-                extracted = self._extract_definition_name(node, code_bytes)
-                if extracted:
-                    current_name = extracted
-            
-            # Recursively visit children
-            for child in node.children:
-                visit_node(child, current_name)
         
-        visit_node(tree.root_node)
         return results
     
+    def _enclosing_definition(self, node, code_bytes: bytes, language: str) -> Optional[str]:
+        """Name of the nearest enclosing function/class/variable definition."""
+        parent = node.parent
+        while parent is not None:
+            if self._is_definition_node(parent.type, language):
+                name = self._extract_definition_name(parent, code_bytes)
+                if name:
+                    return name
+            parent = parent.parent
+        return None
+    
     def _is_definition_node(self, node_type: str, language: str) -> bool:
         """Check if node type is a definition."""
         lang_defs = self.DEFINITION_NODES.get(language, {})
@@ -295,12 +458,18 @@ class TreeSitterEngine:
             return True
         return False
     
-    def _get_line_at(self, code: str, line_index: int) -> str:
-        """Get a specific line from code."""
-        lines = code.split('\n')
-        if 0 <= line_index < len(lines):
-            return lines[line_index].strip()
-        return ''
+    @staticmethod
+    def _line_of(code_bytes: bytes, offset: int) -> str:
+        """Get the stripped source line containing a byte offset.
+        
+        Only that line is decoded, rather than splitting the whole file for
+        every match.
+        """
+        start = code_bytes.rfind(b'\n', 0, offset) + 1
+        end = code_bytes.find(b'\n', offset)
+        if end == -1:
+            end = len(code_bytes)
+        return code_bytes[start:end].decode('utf-8', errors='ignore').strip()
     
     def _fallback_search(
         self,
@@ -335,16 +504,21 @@ class TreeSitterEngine:
         for filepath in self._iter_source_files(search_path):
             try:
                 with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                    lines = f.readlines()
+                    text = f.read()
+                
+                # Any line match is also a match in the whole text, so files
+                # with no match anywhere are skipped without splitting lines
+                if not any(pattern.search(text) for pattern, _ in patterns):
+                    continue
+                
+                try:
+                    rel_path = str(filepath.relative_to(self.project_root))
+                except ValueError:
+                    rel_path = str(filepath)
                 
-                for i, line in enumerate(lines, 1):
+                for i, line in enumerate(io.StringIO(text), 1):
                     for pattern, sym_type in patterns:
                         if pattern.search(line):
-                            try:
-                                rel_path = str(filepath.relative_to(self.project_root))
-                            except ValueError:
-                                rel_path = str(filepath)
-                            
                             results.append({
                                 'file': rel_path,
                                 'line': i,
@@ -361,6 +535,23 @@ class TreeSitterEngine:
         return results
 
 
+# Per-process engine for search_symbol's worker pool. Parsers cannot be
+# pickled, so each worker creates its own.
+_worker_engine: Optional[TreeSitterEngine] = None
+
+
+def _init_worker(project_root: str):
+    global _worker_engine
+    _worker_engine = TreeSitterEngine(project_root)
+    _worker_engine.TREE_CACHE_SIZE = 0  # workers search each file once
+
+
+def _search_file_worker(job: Tuple[str, str, str, str]) -> List[Dict[str, Any]]:
+    filepath, symbol, relation, lang = job
+    contains = _worker_engine._symbol_prefilter(symbol, relation)
+    return _worker_engine._search_file(Path(filepath), symbol, relation, lang, contains)
+
+
 if __name__ == '__main__':
     import json
     import sys
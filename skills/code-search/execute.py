@@ -14,10 +14,20 @@ Protocol:
 
 import sys
 import json
+import functools
+import hashlib
 import os
+import re
+import threading
+from concurrent.futures import Future
 from pathlib import Path
 from typing import Dict, Any, Optional
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
 
@@ -28,6 +38,13 @@ _treesitter_engine = None
 _semantic_engine = None
 
 
+def dumps(data: Any) -> str:
+    """Serialize a response, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data).decode()
+    return json.dumps(data, ensure_ascii=False)
+
+
 def get_project_root() -> Path:
     """Get project root from environment or default to cwd."""
     root = os.environ.get('DDOS_PROJECT_ROOT', os.getcwd())
@@ -44,6 +61,7 @@ def search_codebase(args: Dict[str, Any]) -> Dict[str, Any]:
         language: Language filter
         limit: Max results (default 10)
         mode: 'text', 'semantic', or 'auto'
+        no_cache: Skip the result cache for near-duplicate queries
     """
     query = args.get('query', '')
     if not query:
@@ -55,8 +73,27 @@ def search_codebase(args: Dict[str, Any]) -> Dict[str, Any]:
     mode = args.get('mode', 'auto')
     
     project_root = get_project_root()
+    
+    # Near-duplicate queries with the same arguments reuse earlier semantic
+    # results. Only the semantic part is cached: ripgrep matches text exactly
+    # (getUser and getUsers hit different lines) and must see current files.
+    cache_key = None
+    if mode in ('semantic', 'auto') and not args.get('no_cache', False):
+        cache_key = hashlib.sha1(
+            json.dumps([str(project_root), scope, language, limit]).encode('utf-8')
+        ).hexdigest()
+    
     results = []
     
+    # Semantic search runs in the background while ripgrep searches; in auto
+    # mode its results are only used if ripgrep finds few matches, otherwise
+    # it is cancelled before it calls the embedding API or writes the cache
+    semantic_future = None
+    semantic_cancelled = threading.Event()
+    if mode in ('semantic', 'auto'):
+        semantic_future = _run_in_background(
+            _search_semantic, query, scope, language, limit, cache_key, semantic_cancelled)
+    
     # Text search (ripgrep)
     if mode in ('text', 'auto'):
         rg_engine = RipgrepEngine(str(project_root))
@@ -76,7 +113,7 @@ def search_codebase(args: Dict[str, Any]) -> Dict[str, Any]:
     # Semantic search (if mode is semantic or auto with few text results)
     if mode == 'semantic' or (mode == 'auto' and len(results) < limit // 2):
         try:
-            semantic_results = _search_semantic(query, scope, language, limit)
+            semantic_results = semantic_future.result()
             
             # Deduplicate with text results
             existing_files = {(r['file'], r['line']) for r in results}
@@ -89,6 +126,8 @@ def search_codebase(args: Dict[str, Any]) -> Dict[str, Any]:
             # Semantic search is optional, don't fail
             if mode == 'semantic':
                 return {'status': 'error', 'message': f'Semantic search failed: {e}'}
+    else:
+        semantic_cancelled.set()
     
     # Sort by relevance and limit
     results.sort(key=lambda x: x.get('relevance', 0.5), reverse=True)
@@ -140,16 +179,36 @@ def search_symbol(args: Dict[str, Any]) -> Dict[str, Any]:
     # Build search patterns based on relation
     patterns = _build_symbol_patterns(symbol, relation)
     
+    # One search for all patterns, as an alternation of named groups; each
+    # hit is attributed to the first pattern its line matches. Every pattern
+    # has its own budget of 20 hits, so frequent ones (e.g. variables) can't
+    # crowd out the rest. The search only stops early once all budgets are
+    # spent: while a rare pattern is under budget, rg keeps scanning and the
+    # matches of patterns that are already full are parsed and dropped
     all_results = []
-    for pattern, pattern_type in patterns:
+    if patterns:
+        combined = '|'.join(f'(?P<{pattern_type}>{pattern})' for pattern, pattern_type in patterns)
+        by_type = {pattern_type: [] for _, pattern_type in patterns}
+        
+        def accept(r):
+            pattern_type = _classify_symbol_match(symbol, relation, r.get('match', ''))
+            if len(by_type[pattern_type]) >= 20:
+                return False
+            r['relation_type'] = pattern_type
+            by_type[pattern_type].append(r)
+            return True
+        
         results = rg_engine.search(
-            query=pattern,
+            query=combined,
             scope=scope,
-            limit=20
+            limit=20 * len(patterns),
+            accept=accept
         )
-        for r in results:
-            r['relation_type'] = pattern_type
-        all_results.extend(results)
+        # Timeouts and rg failures come back as a single error entry
+        if results and 'error' in results[0]:
+            return {'status': 'error', 'message': f"Symbol search failed: {results[0]['error']}"}
+        for matches in by_type.values():
+            all_results.extend(matches)
     
     # Deduplicate and rank
     seen = set()
@@ -195,13 +254,65 @@ def search_files(args: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+def _run_in_background(fn, *args) -> Future:
+    """Call fn(*args) on a daemon thread and return a Future for the result.
+    
+    Unlike ThreadPoolExecutor workers, daemon threads are not joined at
+    exit, so an abandoned call does not keep the process alive.
+    """
+    future = Future()
+    
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+    
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
 def _search_semantic(
     query: str,
     scope: Optional[str],
     language: Optional[str],
-    limit: int
+    limit: int,
+    cache_key: Optional[str] = None,
+    cancelled: Optional[threading.Event] = None
 ) -> list:
-    """Semantic search using embeddings (lazy loaded)."""
+    """Semantic search using embeddings (lazy loaded).
+    
+    With a cache_key, results of a recent near-duplicate query are reused.
+    Once cancelled is set, no further embedding requests or cache writes
+    are made and [] is returned.
+    """
+    engine = _get_semantic_engine()
+    if engine is None or (cancelled is not None and cancelled.is_set()):
+        return []
+    
+    if cache_key is not None:
+        try:
+            cached = engine.cached_results(query, cache_key)
+        except Exception:
+            cached = None  # the cache is optional, like semantic search
+        if cached is not None:
+            return cached
+    
+    results = engine.search(query, scope, language, limit, cancelled)
+    
+    if cache_key is not None and not (cancelled is not None and cancelled.is_set()):
+        try:
+            engine.cache_results(query, cache_key, results)
+        except Exception:
+            pass
+    
+    return results
+
+
+def _get_semantic_engine():
+    """The semantic engine, loaded on first use (None if unavailable)."""
     global _semantic_engine
     
     if _semantic_engine is None:
@@ -209,9 +320,9 @@ def _search_semantic(
             from engines.semantic_engine import SemanticEngine
             _semantic_engine = SemanticEngine(str(get_project_root()))
         except ImportError:
-            return []
+            return None
     
-    return _semantic_engine.search(query, scope, language, limit)
+    return _semantic_engine
 
 
 def _search_symbol_treesitter(
@@ -220,7 +331,12 @@ def _search_symbol_treesitter(
     scope: Optional[str],
     project_root: Path
 ) -> list:
-    """Symbol search using tree-sitter (lazy loaded)."""
+    """Symbol search using tree-sitter (lazy loaded).
+    
+    ripgrep first lists the files containing the symbol text, so only those
+    are parsed. References need the exact name; other relations match names
+    case-insensitively, and '*' wildcards are dropped from the literal.
+    """
     global _treesitter_engine
     
     if _treesitter_engine is None:
@@ -230,11 +346,19 @@ def _search_symbol_treesitter(
         except ImportError:
             return []
     
-    return _treesitter_engine.search_symbol(symbol, relation, scope)
+    files = None
+    literal = symbol if relation == 'references' else symbol.strip('*')
+    if literal and _treesitter_engine.available:
+        files = RipgrepEngine(str(project_root)).files_containing(
+            literal, scope, ignore_case=relation != 'references'
+        )
+    
+    return _treesitter_engine.search_symbol(symbol, relation, scope, files)
 
 
-def _build_symbol_patterns(symbol: str, relation: str) -> list:
-    """Build regex patterns for symbol search fallback."""
+@functools.lru_cache(maxsize=1024)
+def _build_symbol_patterns(symbol: str, relation: str) -> tuple:
+    """Build regex patterns for symbol search fallback (cached per symbol/relation)."""
     patterns = []
     
     if relation == 'definition':
@@ -261,18 +385,38 @@ def _build_symbol_patterns(symbol: str, relation: str) -> list:
         patterns.append((f'implements\\s+.*{symbol}', 'implements'))
         patterns.append((f'extends\\s+{symbol}', 'extends'))
     
-    return patterns
+    return tuple(patterns)
+
+
+@functools.lru_cache(maxsize=1024)
+def _symbol_pattern_regexes(symbol: str, relation: str) -> tuple:
+    """_build_symbol_patterns compiled for Python (case-insensitive, like rg -i)."""
+    regexes = []
+    for pattern, pattern_type in _build_symbol_patterns(symbol, relation):
+        try:
+            regexes.append((re.compile(pattern, re.IGNORECASE), pattern_type))
+        except re.error:
+            pass  # not valid Python syntax; such lines go to the first pattern
+    return tuple(regexes)
+
+
+def _classify_symbol_match(symbol: str, relation: str, line: str) -> str:
+    """Type of the first symbol pattern that matches line."""
+    for regex, pattern_type in _symbol_pattern_regexes(symbol, relation):
+        if regex.search(line):
+            return pattern_type
+    return _build_symbol_patterns(symbol, relation)[0][1]
 
 
 def main():
     """Main entry point - read from stdin, dispatch to handler."""
     try:
-        input_data = sys.stdin.read()
+        input_data = sys.stdin.buffer.read()
         if not input_data.strip():
-            print(json.dumps({'status': 'error', 'message': 'No input provided'}))
+            print(dumps({'status': 'error', 'message': 'No input provided'}))
             sys.exit(1)
         
-        request = json.loads(input_data)
+        request = orjson.loads(input_data) if orjson is not None else json.loads(input_data)
         tool = request.get('tool', '')
         args = request.get('args', {})
         
@@ -284,21 +428,21 @@ def main():
         }
         
         if tool not in handlers:
-            print(json.dumps({
+            print(dumps({
                 'status': 'error',
                 'message': f'Unknown tool: {tool}. Available: {list(handlers.keys())}'
             }))
             sys.exit(1)
         
         result = handlers[tool](args)
-        print(json.dumps(result, ensure_ascii=False))
+        print(dumps(result))
         sys.exit(0 if result.get('status') == 'success' else 1)
         
     except json.JSONDecodeError as e:
-        print(json.dumps({'status': 'error', 'message': f'Invalid JSON: {e}'}))
+        print(dumps({'status': 'error', 'message': f'Invalid JSON: {e}'}))
         sys.exit(1)
     except Exception as e:
-        print(json.dumps({'status': 'error', 'message': str(e)}))
+        print(dumps({'status': 'error', 'message': str(e)}))
         sys.exit(1)
 
 
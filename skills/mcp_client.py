@@ -17,6 +17,11 @@ import time
 from typing import Any, Optional
 from dataclasses import dataclass, field
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 # MCP 协议版本
 MCP_PROTOCOL_VERSION = "2024-11-05"
@@ -25,6 +30,16 @@ MCP_PROTOCOL_VERSION = "2024-11-05"
 DEFAULT_TIMEOUT = 30  # 默认请求超时(秒)
 CONNECT_TIMEOUT = 15  # 连接超时(秒)
 
+# 读取线程每次从 stdout 读取的最大字节数
+READ_CHUNK_SIZE = 65536
+
+
+def _loads(data) -> Any:
+    """解析一行 JSON (bytes/memoryview), 有 orjson 时直接解析字节"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(bytes(data))
+
 
 @dataclass
 class MCPTool:
@@ -319,33 +334,41 @@ class MCPClient:
             pass
     
     def _read_responses(self):
-        """后台线程: 持续读取服务器响应"""
+        """后台线程: 持续读取服务器响应
+        
+        按块读取 stdout 到缓冲区, 按换行切分消息, 直接在字节上解析 JSON
+        (不逐行 decode/strip 复制)。
+        """
+        buf = bytearray()
         while self._running and self._process and self._process.poll() is None:
             try:
-                line = self._process.stdout.readline()
-                if not line:
+                # stdout 无缓冲 (bufsize=0): read 只做一次系统调用, 有多少返回多少
+                chunk = self._process.stdout.read(READ_CHUNK_SIZE)
+                if not chunk:
                     time.sleep(0.01)
                     continue
+                buf += chunk
                 
-                line = line.decode('utf-8').strip()
-                if not line:
-                    continue
-                
-                try:
-                    message = json.loads(line)
-                except json.JSONDecodeError:
-                    print(f"[MCPClient:{self.name}] Invalid JSON: {line[:100]}")
-                    continue
-                
-                # 处理响应 (有 id 字段)
-                if "id" in message:
-                    request_id = message["id"]
-                    if request_id in self._response_queue:
-                        self._response_queue[request_id].put(message)
-                
-                # 处理通知 (无 id 字段, 有 method 字段)
-                elif "method" in message:
-                    self._handle_notification(message)
+                start = 0
+                with memoryview(buf) as view:
+                    while True:
+                        end = buf.find(b"\n", start)
+                        if end == -1:
+                            break
+                        # 切片视图用完即释放, 否则 buf 无法调整大小
+                        with view[start:end] as line:
+                            try:
+                                message = _loads(line)
+                            except ValueError:
+                                message = None
+                                preview = line[:100].tobytes().decode('utf-8', errors='replace').strip()
+                                if preview:  # 空行直接跳过
+                                    print(f"[MCPClient:{self.name}] Invalid JSON: {preview}")
+                        start = end + 1
+                        
+                        if message is not None:
+                            self._dispatch_message(message)
+                del buf[:start]
                     
             except Exception as e:
                 if self._running:
@@ -355,6 +378,21 @@ class MCPClient:
         # 进程结束，标记为未连接
         self._connected = False
     
+    def _dispatch_message(self, message: Any):
+        """分发一条服务器消息"""
+        if not isinstance(message, dict):
+            return
+        
+        # 处理响应 (有 id 字段)
+        if "id" in message:
+            request_id = message["id"]
+            if request_id in self._response_queue:
+                self._response_queue[request_id].put(message)
+        
+        # 处理通知 (无 id 字段, 有 method 字段)
+        elif "method" in message:
+            self._handle_notification(message)
+    
     def _handle_notification(self, message: dict):
         """处理服务器发来的通知"""
         method = message.get("method", "")
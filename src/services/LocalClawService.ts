@@ -28,6 +28,7 @@ import { fileRegistry } from './fileRegistry'
 import { FILE_REGISTRY_CONFIG, SOUL_EVOLUTION_CONFIG } from '@/types'
 import { confidenceTracker } from './confidenceTracker'
 import { soulEvolutionService } from './soulEvolutionService'
+import { waitForSkillInstall } from './installService'
 
 // ============================================
 // 类型定义
@@ -1459,11 +1460,17 @@ ${sop ? `\n行为准则:\n${sop.slice(0, 800)}` : ''}
       throw new Error(result.error || `Install failed: ${res.status}`)
     }
 
+    // 服务端异步 clone，轮询直到完成
+    const status = await waitForSkillInstall(this.serverUrl, result.installId)
+    if (status.status === 'error') {
+      throw new Error(status.error || 'Install failed')
+    }
+
     // 重新加载工具和技能列表
     await this.loadTools()
     await this.loadAllDataToStore()
 
-    return result.name
+    return status.name
   }
 
   /**
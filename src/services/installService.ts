@@ -21,6 +21,43 @@ function getServerUrl(): string {
   return localStorage.getItem('duncrew_server_url') || 'http://localhost:3001'
 }
 
+// 技能安装进度 (GET /skills/install/<id>)
+export interface SkillInstallStatus {
+  installId: string
+  status: 'running' | 'done' | 'error'
+  phase: 'cloning' | 'validating' | 'scanning' | 'done' | 'error'
+  name: string
+  path?: string
+  message?: string
+  error?: string
+  toolCount?: number
+}
+
+/**
+ * 轮询技能安装任务直到完成
+ * 服务端 POST /skills/install 立即返回 installId，git clone 在后台执行
+ */
+export async function waitForSkillInstall(
+  serverUrl: string,
+  installId: string,
+  intervalMs = 1000,
+  timeoutMs = 180000,
+): Promise<SkillInstallStatus> {
+  const deadline = Date.now() + timeoutMs
+  while (Date.now() < deadline) {
+    const response = await fetch(`${serverUrl}/skills/install/${installId}`)
+    const status: SkillInstallStatus = await response.json()
+    if (!response.ok) {
+      throw new Error((status as { error?: string }).error || `HTTP ${response.status}`)
+    }
+    if (status.status !== 'running') {
+      return status
+    }
+    await new Promise(resolve => setTimeout(resolve, intervalMs))
+  }
+  throw new Error('安装超时')
+}
+
 /**
  * 安装 SKILL
  * @param skill 要安装的 SKILL 信息
@@ -51,10 +88,17 @@ export async function installSkill(skill: RegistrySkillResult): Promise<InstallR
     }
     
     const data = await response.json()
+    const result = await waitForSkillInstall(serverUrl, data.installId)
+    if (result.status === 'error') {
+      return {
+        success: false,
+        message: result.error || '安装失败',
+      }
+    }
     return {
       success: true,
-      message: data.message || '安装成功',
-      path: data.path,
+      message: result.message || '安装成功',
+      path: result.path,
     }
   } catch (error) {
     console.error('[InstallService] Error installing skill:', error)